@@ -7,6 +7,9 @@ Flow:
 2. Bot generates unique auth link and sends to user
 3. User clicks link -> frontend exchanges token for JWT
 4. Refresh tokens stored hashed (SHA256) in DB
+
+jwt and db_pool (psycopg2) are imported on first use, so CORS preflight and
+request validation errors are answered without loading them.
 """
 
 import json
@@ -15,8 +18,8 @@ import hashlib
 import secrets
 from datetime import datetime, timezone, timedelta
 from typing import Optional
-import psycopg2
-import jwt
+
+import metrics
 
 
 # =============================================================================
@@ -24,7 +27,10 @@ import jwt
 # =============================================================================
 
 def get_db_connection():
-    return psycopg2.connect(os.environ["DATABASE_URL"])
+    """Borrow a pooled connection; use as a context manager."""
+    import db_pool
+
+    return db_pool.connection(os.environ["DATABASE_URL"])
 
 
 def get_schema() -> str:
@@ -52,7 +58,10 @@ def generate_token(length: int = 32) -> str:
     return secrets.token_urlsafe(length)
 
 
+@metrics.timed("jwt.encode")
 def create_jwt(user_id: int, secret: str, expires_in: int = 900) -> str:
+    import jwt
+
     payload = {
         "user_id": user_id,
         "exp": datetime.now(timezone.utc) + timedelta(seconds=expires_in),
@@ -390,6 +399,14 @@ def handle_logout(cursor, body: dict) -> dict:
 # MAIN HANDLER
 # =============================================================================
 
+ACTIONS = {
+    "callback": handle_callback,
+    "refresh": handle_refresh,
+    "logout": handle_logout,
+}
+
+
+@metrics.instrument("telegram-auth")
 def handler(event, context):
     """Main entry point."""
     method = event.get("httpMethod", "GET")
@@ -402,44 +419,31 @@ def handler(event, context):
     params = event.get("queryStringParameters") or {}
     action = params.get("action", "")
 
-    # Parse body for POST requests
-    body = {}
-    if method == "POST":
-        raw_body = event.get("body", "{}")
-        try:
-            body = json.loads(raw_body) if raw_body else {}
-        except json.JSONDecodeError:
-            return cors_response(400, {"error": "Invalid JSON"})
+    # Reject unknown actions before the database is touched
+    action_handler = ACTIONS.get(action) if method == "POST" else None
+    if action_handler is None:
+        return cors_response(400, {"error": f"Unknown action: {action}"})
+
+    # Parse body
+    raw_body = event.get("body", "{}")
+    try:
+        body = json.loads(raw_body) if raw_body else {}
+    except json.JSONDecodeError:
+        return cors_response(400, {"error": "Invalid JSON"})
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        # Cleanup expired tokens periodically
-        cleanup_expired_tokens(cursor)
-        cleanup_expired_refresh_tokens(cursor)
-
-        # Route to action handler
-        if action == "callback" and method == "POST":
-            response = handle_callback(cursor, body)
-        elif action == "refresh" and method == "POST":
-            response = handle_refresh(cursor, body)
-        elif action == "logout" and method == "POST":
-            response = handle_logout(cursor, body)
-        else:
-            response = cors_response(400, {"error": f"Unknown action: {action}"})
-
-        conn.commit()
-        return response
+        with get_db_connection() as conn, conn.cursor() as cursor:
+            # Cleanup expired tokens periodically
+            cleanup_expired_tokens(cursor)
+            cleanup_expired_refresh_tokens(cursor)
+
+            response = action_handler(cursor, body)
+            conn.commit()
+            return response
 
     except ValueError as e:
         return cors_response(500, {"error": "Server configuration error"})
     except Exception as e:
-        if conn:
-            conn.rollback()
+        # Uncommitted work is rolled back when the connection returns to the pool
         print(f"Error: {e}")
         return cors_response(500, {"error": "Internal server error"})
-    finally:
-        if conn:
-            conn.close()
@@ -0,0 +1,405 @@
+"""
+Рассылка одного сообщения многим получателям (action=broadcast в index.py).
+
+Задание и результат по каждому получателю хранятся в telegram_broadcasts и
+telegram_broadcast_recipients (db_migrations/V0013). Вызов отправляет, пока не кончится
+TELEGRAM_BROADCAST_TIME_BUDGET секунд: функция не может работать дольше своего таймаута,
+поэтому большая рассылка продолжается вызовами action=broadcast-resume, а прогресс
+отдаёт action=broadcast-status. Получатели забираются пачками через
+FOR UPDATE SKIP LOCKED, так что параллельные resume не отправят одно сообщение дважды.
+Получатель, застрявший в 'sending' дольше TELEGRAM_BROADCAST_STALE_AFTER секунд
+(инстанс умер посреди пачки), забирается снова — здесь возможен дубль.
+
+Отправляет пул из TELEGRAM_BROADCAST_WORKERS потоков. Лимиты Telegram соблюдают
+token bucket на инстанс: общий (TELEGRAM_BROADCAST_RATE сообщений в секунду) и на каждый чат
+(1 в секунду в личный чат, 20 в минуту в группу или канал). Отправка идёт без повторов
+внутри telegram_client (no_retry): первый же 429 с retry_after останавливает общий bucket
+на это время для всех потоков. Отправка, которая не успевает начаться до конца бюджета
+времени, не делается — получатель возвращается в очередь без траты попытки. После 429
+общая скорость ещё и вдвое снижается и затем понемногу растёт с каждой успешной отправкой
+обратно до TELEGRAM_BROADCAST_RATE (как AIMD): иначе после паузы bucket сразу выдал бы
+прежние rate в секунду и снова упёрся бы в лимит. 429, 5xx и
+неустановившееся соединение возвращают получателя в очередь,
+пока попыток меньше TELEGRAM_BROADCAST_MAX_ATTEMPTS; остальные ошибки (403 — бот
+заблокирован и т. п.) окончательные.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import telebot
+from psycopg2.extras import execute_values
+
+import db_pool
+import metrics
+import telegram_client
+
+RATE = float(os.environ.get('TELEGRAM_BROADCAST_RATE', '25'))
+WORKERS = int(os.environ.get('TELEGRAM_BROADCAST_WORKERS', '8'))
+TIME_BUDGET = float(os.environ.get('TELEGRAM_BROADCAST_TIME_BUDGET', '20'))
+MAX_ATTEMPTS = int(os.environ.get('TELEGRAM_BROADCAST_MAX_ATTEMPTS', '3'))
+STALE_AFTER = int(os.environ.get('TELEGRAM_BROADCAST_STALE_AFTER', '300'))
+MAX_RECIPIENTS = int(os.environ.get('TELEGRAM_BROADCAST_MAX_RECIPIENTS', '50000'))
+BATCH_SIZE = WORKERS * 8
+PRIVATE_CHAT_RATE = 1.0
+GROUP_CHAT_RATE = 20 / 60
+MAX_CHAT_BUCKETS = 10000
+MAX_RESULTS_PAGE = 1000
+MIN_RATE = 1.0
+RATE_RECOVERY_STEP = 0.1
+
+
+class TokenBucket:
+    """
+    Бакет с резервированием: reserve() сразу забирает токен (счётчик может уйти в минус)
+    и говорит, сколько ждать, — ждут вне блокировки, порядок выдачи сохраняется
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def cancel(self) -> None:
+        """Возвращает токен, взятый reserve(), если отправки не будет"""
+        with self._lock:
+            self.tokens += 1
+
+    def set_rate(self, rate: float) -> None:
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds: float) -> None:
+        """Следующий токен — не раньше чем через seconds"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def idle(self) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    def __init__(self, rate: float):
+        self.max_rate = rate
+        self._backoff_until = 0.0
+        # Небольшой запас на всплеск: за любую секунду уходит не больше 1.2 * rate
+        self.global_bucket = TokenBucket(rate, capacity=max(1.0, rate / 5))
+        self.chats = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self.chats.get(chat_id)
+            if bucket is None:
+                if len(self.chats) >= MAX_CHAT_BUCKETS:
+                    self.chats = {key: b for key, b in self.chats.items() if not b.idle()}
+                is_group = chat_id.startswith('-') or chat_id.startswith('@')
+                bucket = self.chats[chat_id] = TokenBucket(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE, 1)
+            return bucket
+
+    def acquire(self, chat_id: str, deadline: float = None) -> bool:
+        """Ждёт своей очереди; False — очередь наступит позже deadline (time.monotonic)"""
+        chat_bucket = self._chat_bucket(chat_id)
+        wait = max(self.global_bucket.reserve(), chat_bucket.reserve())
+        if deadline is not None and time.monotonic() + wait > deadline:
+            self.global_bucket.cancel()
+            chat_bucket.cancel()
+            return False
+        if wait:
+            with metrics.phase('broadcast.rate_wait'):
+                time.sleep(wait)
+        return True
+
+    def backoff(self, seconds: float) -> None:
+        """
+        429: пауза на retry_after и вдвое меньшая скорость. 429 на запросы, ушедшие
+        до паузы, скорость повторно не снижают
+        """
+        with self._lock:
+            now = time.monotonic()
+            halve = now >= self._backoff_until
+            self._backoff_until = max(self._backoff_until, now + seconds)
+        if halve:
+            self.global_bucket.set_rate(max(MIN_RATE, self.global_bucket.rate / 2))
+        self.global_bucket.pause(seconds)
+
+    def succeeded(self) -> None:
+        rate = self.global_bucket.rate
+        if rate < self.max_rate:
+            self.global_bucket.set_rate(min(self.max_rate, rate + RATE_RECOVERY_STEP))
+
+
+limiter = RateLimiter(RATE)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='broadcast')
+    return _executor
+
+
+def get_schema() -> str:
+    schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    return f'{schema}.' if schema else ''
+
+
+def connection():
+    return db_pool.connection(os.environ['DATABASE_URL'])
+
+
+# =============================================================================
+# STORAGE
+# =============================================================================
+
+def audience_chat_ids(cursor, audience: str) -> list:
+    """Сохранённая аудитория: 'users' — все пользователи, вошедшие через Telegram"""
+    if audience != 'users':
+        raise ValueError(f'Unknown audience: {audience}')
+    cursor.execute(f"""
+        SELECT telegram_id FROM {get_schema()}users
+        WHERE telegram_id IS NOT NULL AND telegram_id <> ''
+        ORDER BY id
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def create_job(cursor, message: dict, chat_ids: list) -> str:
+    schema = get_schema()
+    job_id = str(uuid.uuid4())
+    cursor.execute(f"""
+        INSERT INTO {schema}telegram_broadcasts (id, text, photo_url, parse_mode, silent, total)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, (job_id, message['text'], message['photo_url'], message['parse_mode'], message['silent'], len(chat_ids)))
+    cursor.execute(f"""
+        INSERT INTO {schema}telegram_broadcast_recipients (broadcast_id, chat_id)
+        SELECT %s, chat_id FROM unnest(%s::text[]) WITH ORDINALITY AS r(chat_id, position)
+        ORDER BY position
+    """, (job_id, chat_ids))
+    return job_id
+
+
+def load_job(cursor, job_id: str):
+    cursor.execute(f"""
+        SELECT id, text, photo_url, parse_mode, silent, status, total, created_at, finished_at
+        FROM {get_schema()}telegram_broadcasts WHERE id = %s
+    """, (job_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return {
+        'id': str(row[0]),
+        'text': row[1],
+        'photo_url': row[2],
+        'parse_mode': row[3],
+        'silent': row[4],
+        'status': row[5],
+        'total': row[6],
+        'created_at': row[7].isoformat() if row[7] else None,
+        'finished_at': row[8].isoformat() if row[8] else None,
+    }
+
+
+def claim(cursor, job_id: str, limit: int) -> list:
+    """[(recipient id, chat_id, attempts)] переведённые в 'sending'"""
+    table = f'{get_schema()}telegram_broadcast_recipients'
+    cursor.execute(f"""
+        UPDATE {table}
+        SET status = 'sending', claimed_at = NOW(), attempts = attempts + 1
+        WHERE id = ANY(ARRAY(
+            SELECT id FROM {table}
+            WHERE broadcast_id = %s
+              AND (status = 'pending'
+                   OR (status = 'sending' AND claimed_at < NOW() - make_interval(secs => %s)))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING id, chat_id, attempts
+    """, (job_id, STALE_AFTER, limit))
+    return sorted(cursor.fetchall())
+
+
+def record(cursor, results: list) -> None:
+    """
+    results: [(recipient id, status, message_id, error_code, error)];
+    'released' — не отправляли, получатель возвращается в очередь без траты попытки
+    """
+    execute_values(cursor, f"""
+        UPDATE {get_schema()}telegram_broadcast_recipients AS r
+        SET status = CASE WHEN v.status = 'released' THEN 'pending' ELSE v.status END,
+            attempts = r.attempts - CASE WHEN v.status = 'released' THEN 1 ELSE 0 END,
+            message_id = v.message_id::bigint,
+            error_code = v.error_code::integer,
+            error = v.error,
+            sent_at = CASE WHEN v.status = 'sent' THEN NOW() END
+        FROM (VALUES %s) AS v(id, status, message_id, error_code, error)
+        WHERE r.id = v.id
+    """, results)
+
+
+def progress(cursor, job_id: str) -> dict:
+    cursor.execute(f"""
+        SELECT status, COUNT(*) FROM {get_schema()}telegram_broadcast_recipients
+        WHERE broadcast_id = %s GROUP BY status
+    """, (job_id,))
+    counts = dict(cursor.fetchall())
+    return {
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'pending': counts.get('pending', 0) + counts.get('sending', 0),
+    }
+
+
+def finish_if_done(cursor, job_id: str) -> None:
+    schema = get_schema()
+    cursor.execute(f"""
+        UPDATE {schema}telegram_broadcasts SET status = 'done', finished_at = NOW()
+        WHERE id = %s AND status = 'running' AND NOT EXISTS (
+            SELECT 1 FROM {schema}telegram_broadcast_recipients
+            WHERE broadcast_id = %s AND status IN ('pending', 'sending')
+        )
+    """, (job_id, job_id))
+
+
+def results_page(cursor, job_id: str, status: str, after: int, limit: int) -> tuple:
+    """(results, курсор следующей страницы или None)"""
+    cursor.execute(f"""
+        SELECT id, chat_id, status, attempts, message_id, error_code, error, sent_at
+        FROM {get_schema()}telegram_broadcast_recipients
+        WHERE broadcast_id = %s AND id > %s
+          AND (%s::text IS NULL OR status = %s OR (%s = 'pending' AND status = 'sending'))
+        ORDER BY id
+        LIMIT %s
+    """, (job_id, after, status, status, status, limit + 1))
+    rows = cursor.fetchall()
+    results = [
+        {
+            'chat_id': row[1],
+            'status': row[2],
+            'attempts': row[3],
+            'message_id': row[4],
+            'error_code': row[5],
+            'error': row[6],
+            'sent_at': row[7].isoformat() if row[7] else None,
+        }
+        for row in rows[:limit]
+    ]
+    return results, (rows[limit - 1][0] if len(rows) > limit else None)
+
+
+# =============================================================================
+# SENDING
+# =============================================================================
+
+def send_one(bot, job: dict, recipient: tuple, deadline: float) -> tuple:
+    recipient_id, chat_id, attempts = recipient
+    if not limiter.acquire(chat_id, deadline):
+        return recipient_id, 'released', None, None, None
+    try:
+        if job['photo_url']:
+            result = bot.send_photo(
+                chat_id=chat_id,
+                photo=job['photo_url'],
+                caption=job['text'] or None,
+                parse_mode=job['parse_mode'],
+                disable_notification=job['silent'],
+            )
+        else:
+            result = bot.send_message(
+                chat_id=chat_id,
+                text=job['text'],
+                parse_mode=job['parse_mode'],
+                disable_notification=job['silent'],
+                disable_web_page_preview=True,
+            )
+        limiter.succeeded()
+        return recipient_id, 'sent', result.message_id, None, None
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code == 429:
+            retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after') or 1
+            limiter.backoff(float(retry_after))
+        retryable = e.error_code == 429 or e.error_code >= 500
+        status = 'pending' if retryable and attempts < MAX_ATTEMPTS else 'failed'
+        return recipient_id, status, None, e.error_code, e.description
+    except requests.ConnectionError as e:
+        if telegram_client.request_not_sent(e):
+            status = 'pending' if attempts < MAX_ATTEMPTS else 'failed'
+            return recipient_id, status, None, None, str(e)
+        # Обрыв после отправки: доставка неизвестна, повтор мог бы дать дубль
+        return recipient_id, 'failed', None, None, str(e)
+    except Exception as e:
+        # Таймаут чтения и прочее: доставка неизвестна, повтор мог бы дать дубль
+        return recipient_id, 'failed', None, None, str(e)
+
+
+def send_without_retry(bot, job: dict, recipient: tuple, deadline: float) -> tuple:
+    with telegram_client.no_retry():
+        return send_one(bot, job, recipient, deadline)
+
+
+def run(bot, job: dict, time_budget: float = TIME_BUDGET) -> dict:
+    """Отправляет пачками, пока есть получатели и не вышло время; возвращает прогресс"""
+    deadline = time.monotonic() + time_budget
+    executor = get_executor()
+    while time.monotonic() < deadline:
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                batch = claim(cursor, job['id'], BATCH_SIZE)
+            conn.commit()
+        if not batch:
+            break
+
+        with metrics.phase('broadcast.send'):
+            results = list(executor.map(
+                lambda recipient: send_without_retry(bot, job, recipient, deadline), batch
+            ))
+
+        with connection() as conn:
+            with conn.cursor() as cursor:
+                record(cursor, results)
+            conn.commit()
+        if all(result[1] == 'released' for result in results):
+            break
+
+    with connection() as conn:
+        with conn.cursor() as cursor:
+            finish_if_done(cursor, job['id'])
+            state = load_job(cursor, job['id'])
+            counts = progress(cursor, job['id'])
+        conn.commit()
+    return status_body(state, counts)
+
+
+def status_body(job: dict, counts: dict) -> dict:
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'total': job['total'],
+        **counts,
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
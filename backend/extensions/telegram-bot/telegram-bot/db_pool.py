@@ -0,0 +1,195 @@
+"""
+Пул соединений с Postgres на уровне модуля.
+Переживает тёплые вызовы функции: соединение берётся из пула вместо
+нового TCP+TLS+auth рукопожатия на каждый запрос.
+Время ожидания пула, новых подключений, запросов и commit отмечается в metrics
+как фазы db.acquire, db.connect, db.query и db.commit.
+Файл одинаковый во всех функциях с БД — правки вносить во все копии.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+import metrics
+
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', '300'))
+POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+POOL_CHECK_AFTER = float(os.environ.get('DB_POOL_CHECK_AFTER', '5'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('DB_POOL_ACQUIRE_TIMEOUT', '10'))
+
+
+class TimedCursor(extensions.cursor):
+    def execute(self, query, vars=None):
+        with metrics.phase('db.query'):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        with metrics.phase('db.query'):
+            return super().executemany(query, vars_list)
+
+
+class TimedConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+
+    def commit(self):
+        with metrics.phase('db.commit'):
+            return super().commit()
+
+
+class PoolExhausted(Exception):
+    """Все соединения заняты дольше POOL_ACQUIRE_TIMEOUT"""
+
+
+class ConnectionPool:
+    """
+    Ограниченный пул: не больше max_size соединений одновременно.
+    Простаивающие дольше max_idle и живущие дольше max_lifetime соединения закрываются,
+    перед выдачей соединение, простоявшее дольше check_after, проверяется через SELECT 1.
+    """
+
+    def __init__(self, dsn: str, max_size: int = POOL_MAX_SIZE, max_idle: float = POOL_MAX_IDLE,
+                 max_lifetime: float = POOL_MAX_LIFETIME, check_after: float = POOL_CHECK_AFTER):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_after = check_after
+        self._idle = []
+        self._opened_at = {}
+        self._size = 0
+        self._cond = threading.Condition()
+
+    def _discard(self, conn) -> None:
+        self._opened_at.pop(id(conn), None)
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, returned_at: float, now: float) -> bool:
+        if conn.closed:
+            return True
+        if now - returned_at > self.max_idle:
+            return True
+        return now - self._opened_at.get(id(conn), now) > self.max_lifetime
+
+    def _healthy(self, conn, returned_at: float) -> bool:
+        if time.monotonic() - returned_at < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def acquire(self, timeout: float = POOL_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    conn, returned_at = self._idle.pop()
+                    if self._expired(conn, returned_at, now):
+                        self._discard(conn)
+                        continue
+                    break
+                else:
+                    conn = None
+
+                if conn is not None:
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolExhausted(f'No free connection within {timeout}s (max_size={self.max_size})')
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            if self._healthy(conn, returned_at):
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._size += 1
+
+        try:
+            with metrics.phase('db.connect'):
+                conn = psycopg2.connect(self.dsn, connection_factory=TimedConnection)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._opened_at[id(conn)] = time.monotonic()
+        return conn
+
+    def release(self, conn, discard: bool = False) -> None:
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        with self._cond:
+            if discard or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Выдаёт соединение; незакоммиченная транзакция откатывается при возврате в пул"""
+        with metrics.phase('db.acquire'):
+            conn = self.acquire()
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self) -> None:
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str = None) -> ConnectionPool:
+    """Пул для DSN (по умолчанию DATABASE_URL), создаётся один раз на процесс"""
+    dsn = dsn or os.environ['DATABASE_URL']
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = _pools[dsn] = ConnectionPool(dsn)
+    return pool
+
+
+def connection(dsn: str = None):
+    """Короткая форма: with db_pool.connection() as conn: ..."""
+    return get_pool(dsn).connection()
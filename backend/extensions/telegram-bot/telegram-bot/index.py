@@ -5,6 +5,10 @@ Telegram Bot Function
 1. Webhook от Telegram для авторизации через /start web_auth
 2. Отправку уведомлений через API (action=send, action=send-photo)
 3. Тестовые сообщения (action=test)
+4. Рассылки многим получателям (action=broadcast, broadcast-resume, broadcast-status)
+
+telebot и db_pool (psycopg2) импортируются в тех ветках, где нужны: preflight и
+ошибки валидации обходятся без тяжёлых импортов, холодный старт короче.
 """
 
 import json
@@ -12,10 +16,12 @@ import os
 import uuid
 import hashlib
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
+
+import metrics
 
-import psycopg2
-import telebot
+if TYPE_CHECKING:
+    import telebot
 
 
 # =============================================================================
@@ -30,9 +36,11 @@ def get_bot_token() -> str:
     return token
 
 
-def get_bot() -> telebot.TeleBot:
-    """Create bot instance."""
-    return telebot.TeleBot(get_bot_token())
+def get_bot() -> "telebot.TeleBot":
+    """Cached bot instance sharing one keep-alive HTTP session (see telegram_client)."""
+    import telegram_client
+
+    return telegram_client.get_bot(get_bot_token())
 
 
 def get_default_chat_id() -> str:
@@ -54,7 +62,7 @@ def get_cors_headers() -> dict:
     allowed_origins = os.environ.get("ALLOWED_ORIGINS", "*")
     return {
         "Access-Control-Allow-Origin": allowed_origins,
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
+        "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
         "Access-Control-Allow-Headers": "Content-Type, X-Telegram-Bot-Api-Secret-Token",
     }
 
@@ -86,13 +94,13 @@ def save_auth_token(
     last_name: Optional[str]
 ) -> str:
     """Сохраняет токен авторизации в БД и возвращает его."""
+    import db_pool
+
     token = str(uuid.uuid4())
     token_hash = hashlib.sha256(token.encode()).hexdigest()
     schema = get_schema()
 
-    conn = psycopg2.connect(os.environ["DATABASE_URL"])
-    try:
-        cursor = conn.cursor()
+    with db_pool.connection(os.environ["DATABASE_URL"]) as conn, conn.cursor() as cursor:
         cursor.execute(f"""
             INSERT INTO {schema}telegram_auth_tokens
             (token_hash, telegram_id, telegram_username, telegram_first_name,
@@ -108,8 +116,6 @@ def save_auth_token(
             datetime.now(timezone.utc) + timedelta(minutes=5)
         ))
         conn.commit()
-    finally:
-        conn.close()
 
     return token
 
@@ -120,6 +126,8 @@ def save_auth_token(
 
 def handle_web_auth(chat_id: int, user: dict) -> None:
     """Обработка команды /start web_auth."""
+    import telebot
+
     telegram_id = str(user.get("id", ""))
     username = user.get("username")
     first_name = user.get("first_name")
@@ -131,19 +139,21 @@ def handle_web_auth(chat_id: int, user: dict) -> None:
     auth_url = f"{site_url}/auth/telegram/callback?token={token}"
 
     bot = get_bot()
-    bot.send_message(
-        chat_id,
-        f"Авторизация готова!\n\nНажмите кнопку ниже, чтобы войти на сайт 👇\n\nСсылка действительна 5 минут.",
-        reply_markup=telebot.types.InlineKeyboardMarkup().add(
-            telebot.types.InlineKeyboardButton("Войти на сайт", url=auth_url)
+    with metrics.phase("telegram.api"):
+        bot.send_message(
+            chat_id,
+            f"Авторизация готова!\n\nНажмите кнопку ниже, чтобы войти на сайт 👇\n\nСсылка действительна 5 минут.",
+            reply_markup=telebot.types.InlineKeyboardMarkup().add(
+                telebot.types.InlineKeyboardButton("Войти на сайт", url=auth_url)
+            )
         )
-    )
 
 
 def handle_start(chat_id: int) -> None:
     """Обработка команды /start без параметров."""
     bot = get_bot()
-    bot.send_message(chat_id, "Привет! Используйте кнопку «Войти через Telegram» на сайте.")
+    with metrics.phase("telegram.api"):
+        bot.send_message(chat_id, "Привет! Используйте кнопку «Войти через Telegram» на сайте.")
 
 
 def process_webhook(body: dict) -> dict:
@@ -157,16 +167,17 @@ def process_webhook(body: dict) -> dict:
     user = message.get("from", {})
     chat_id = message.get("chat", {}).get("id")
 
-    if not chat_id:
+    if not chat_id or not text.startswith("/start"):
         return {"statusCode": 200, "body": json.dumps({"ok": True})}
 
+    import telebot
+
     try:
-        if text.startswith("/start"):
-            parts = text.split(" ", 1)
-            if len(parts) > 1 and parts[1] == "web_auth":
-                handle_web_auth(chat_id, user)
-            else:
-                handle_start(chat_id)
+        parts = text.split(" ", 1)
+        if len(parts) > 1 and parts[1] == "web_auth":
+            handle_web_auth(chat_id, user)
+        else:
+            handle_start(chat_id)
     except telebot.apihelper.ApiTelegramException as e:
         print(f"Telegram API error: {e}")
     except Exception as e:
@@ -198,15 +209,18 @@ def handle_send(body: dict) -> dict:
     if len(text) > 4096:
         return cors_response(400, {"error": "Message too long (max 4096 characters)"})
 
+    import telebot
+
     try:
         bot = get_bot()
-        result = bot.send_message(
-            chat_id=chat_id,
-            text=text,
-            parse_mode=parse_mode,
-            disable_notification=silent,
-            disable_web_page_preview=True,
-        )
+        with metrics.phase("telegram.api"):
+            result = bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode=parse_mode,
+                disable_notification=silent,
+                disable_web_page_preview=True,
+            )
         return cors_response(200, {
             "success": True,
             "message_id": result.message_id,
@@ -236,14 +250,17 @@ def handle_send_photo(body: dict) -> dict:
     if not chat_id:
         return cors_response(400, {"error": "chat_id is required"})
 
+    import telebot
+
     try:
         bot = get_bot()
-        result = bot.send_photo(
-            chat_id=chat_id,
-            photo=photo_url,
-            caption=caption if caption else None,
-            parse_mode=parse_mode,
-        )
+        with metrics.phase("telegram.api"):
+            result = bot.send_photo(
+                chat_id=chat_id,
+                photo=photo_url,
+                caption=caption if caption else None,
+                parse_mode=parse_mode,
+            )
         return cors_response(200, {
             "success": True,
             "message_id": result.message_id,
@@ -273,13 +290,16 @@ def handle_test(body: dict) -> dict:
 
 <i>Время: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}</i>"""
 
+    import telebot
+
     try:
         bot = get_bot()
-        result = bot.send_message(
-            chat_id=chat_id,
-            text=text,
-            parse_mode="HTML",
-        )
+        with metrics.phase("telegram.api"):
+            result = bot.send_message(
+                chat_id=chat_id,
+                text=text,
+                parse_mode="HTML",
+            )
         return cors_response(200, {
             "success": True,
             "message": "Test message sent",
@@ -294,10 +314,142 @@ def handle_test(body: dict) -> dict:
         return cors_response(500, {"error": str(e)})
 
 
+# =============================================================================
+# BROADCAST HANDLERS
+# =============================================================================
+
+def parse_job_id(value) -> Optional[str]:
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        return None
+
+
+def handle_broadcast(body: dict) -> dict:
+    """
+    POST ?action=broadcast
+    Send one message to many chats: {"chat_ids": [...]} or {"audience": "users"}.
+    Sends until the time budget runs out; 202 means the job continues via broadcast-resume.
+    """
+    text = body.get("text", "").strip()
+    photo_url = body.get("photo_url", "").strip()
+    chat_ids = body.get("chat_ids")
+    audience = body.get("audience")
+
+    if not text and not photo_url:
+        return cors_response(400, {"error": "text or photo_url is required"})
+
+    if len(text) > (1024 if photo_url else 4096):
+        return cors_response(400, {"error": "Message too long"})
+
+    if (chat_ids is None) == (audience is None):
+        return cors_response(400, {"error": "Exactly one of chat_ids or audience is required"})
+
+    if audience is not None and audience != "users":
+        return cors_response(400, {"error": f"Unknown audience: {audience}"})
+
+    if chat_ids is not None:
+        if not isinstance(chat_ids, list) or not chat_ids or \
+                not all(isinstance(c, (int, str)) and not isinstance(c, bool) for c in chat_ids):
+            return cors_response(400, {"error": "chat_ids must be a non-empty list"})
+        chat_ids = list(dict.fromkeys(str(c).strip() for c in chat_ids if str(c).strip()))
+
+    message = {
+        "text": text,
+        "photo_url": photo_url or None,
+        "parse_mode": body.get("parse_mode", "HTML"),
+        "silent": bool(body.get("silent", False)),
+    }
+
+    import broadcast
+
+    try:
+        bot = get_bot()
+        with broadcast.connection() as conn, conn.cursor() as cursor:
+            if audience is not None:
+                chat_ids = broadcast.audience_chat_ids(cursor, audience)
+            if not chat_ids:
+                return cors_response(400, {"error": "No recipients"})
+            if len(chat_ids) > broadcast.MAX_RECIPIENTS:
+                return cors_response(400, {"error": f"Too many recipients (max {broadcast.MAX_RECIPIENTS})"})
+            job_id = broadcast.create_job(cursor, message, chat_ids)
+            job = broadcast.load_job(cursor, job_id)
+            conn.commit()
+
+        result = broadcast.run(bot, job)
+        return cors_response(200 if result["status"] == "done" else 202, result)
+    except Exception as e:
+        return cors_response(500, {"error": str(e)})
+
+
+def handle_broadcast_resume(body: dict) -> dict:
+    """
+    POST ?action=broadcast-resume
+    Continue sending a job that did not finish within one call.
+    """
+    job_id = parse_job_id(body.get("job_id"))
+    if not job_id:
+        return cors_response(400, {"error": "job_id is required"})
+
+    import broadcast
+
+    try:
+        with broadcast.connection() as conn, conn.cursor() as cursor:
+            job = broadcast.load_job(cursor, job_id)
+            counts = broadcast.progress(cursor, job_id) if job else None
+        if not job:
+            return cors_response(404, {"error": "Job not found"})
+        if job["status"] == "done":
+            return cors_response(200, broadcast.status_body(job, counts))
+
+        result = broadcast.run(get_bot(), job)
+        return cors_response(200 if result["status"] == "done" else 202, result)
+    except Exception as e:
+        return cors_response(500, {"error": str(e)})
+
+
+def handle_broadcast_status(params: dict) -> dict:
+    """
+    GET ?action=broadcast-status&job_id=...[&results=failed&after=0&limit=100]
+    Job progress; per-recipient results when `results` is given (all, sent, failed, pending).
+    """
+    job_id = parse_job_id(params.get("job_id"))
+    if not job_id:
+        return cors_response(400, {"error": "job_id is required"})
+
+    results_filter = params.get("results")
+    if results_filter not in (None, "all", "sent", "failed", "pending"):
+        return cors_response(400, {"error": "results must be one of: all, sent, failed, pending"})
+    try:
+        after = int(params.get("after", 0))
+        limit = int(params.get("limit", 100))
+    except ValueError:
+        return cors_response(400, {"error": "after and limit must be integers"})
+
+    import broadcast
+
+    limit = max(1, min(limit, broadcast.MAX_RESULTS_PAGE))
+    try:
+        with broadcast.connection() as conn, conn.cursor() as cursor:
+            job = broadcast.load_job(cursor, job_id)
+            if not job:
+                return cors_response(404, {"error": "Job not found"})
+            result = broadcast.status_body(job, broadcast.progress(cursor, job_id))
+            if results_filter:
+                status = None if results_filter == "all" else results_filter
+                result["results"], result["next_after"] = broadcast.results_page(
+                    cursor, job_id, status, after, limit
+                )
+        return cors_response(200, result)
+    except Exception as e:
+        return cors_response(500, {"error": str(e)})
+
+
 # =============================================================================
 # MAIN HANDLER
 # =============================================================================
 
+@metrics.instrument("telegram-bot")
 def handler(event: dict, context) -> dict:
     """Main entry point."""
     method = event.get("httpMethod", "POST")
@@ -324,6 +476,12 @@ def handler(event: dict, context) -> dict:
             return handle_send_photo(body)
         elif action == "test" and method == "POST":
             return handle_test(body)
+        elif action == "broadcast" and method == "POST":
+            return handle_broadcast(body)
+        elif action == "broadcast-resume" and method == "POST":
+            return handle_broadcast_resume(body)
+        elif action == "broadcast-status" and method == "GET":
+            return handle_broadcast_status(params)
         else:
             return cors_response(400, {"error": f"Unknown action: {action}"})
 
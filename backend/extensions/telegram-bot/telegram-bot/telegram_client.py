@@ -0,0 +1,139 @@
+"""
+Клиент Bot API на уровне модуля: один TeleBot на токен и одна keep-alive сессия requests
+на инстанс. Тёплые вызовы отправляют сообщения по уже открытому TLS-соединению,
+без нового рукопожатия с api.telegram.org на каждое уведомление.
+
+Запросы telebot идут через send_request (apihelper.CUSTOM_REQUEST_SENDER):
+  - 429 и 5xx повторяются до TELEGRAM_MAX_RETRIES раз; пауза — parameters.retry_after
+    из ответа Telegram, иначе экспоненциальная с джиттером от TELEGRAM_RETRY_BACKOFF секунд;
+    retry_after больше TELEGRAM_MAX_RETRY_AFTER не ждём — ответ уходит вызывающему как есть;
+  - ошибки установки соединения (ConnectTimeout, NewConnectionError — запрос не ушёл)
+    повторяются так же; таймаут чтения и обрыв уже установленного соединения — нет:
+    Telegram мог принять сообщение, повтор дал бы дубль;
+  - запросы с загрузкой файлов не повторяются.
+Ожидание между попытками отмечается в metrics фазой telegram.retry_wait.
+Внутри `with no_retry():` запросы потока не повторяются — для рассылки, у которой свой
+лимитер: 429 должен сразу остановить общий bucket, а не ждать в одном из потоков.
+
+Таймауты: TELEGRAM_CONNECT_TIMEOUT, TELEGRAM_READ_TIMEOUT (секунды).
+TELEGRAM_API_URL — другой адрес Bot API (локальный сервер, тестовый стенд), например
+http://127.0.0.1:8081; запросы идут на {TELEGRAM_API_URL}/bot<token>/<method>.
+"""
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+import telebot
+from requests.adapters import HTTPAdapter
+from telebot import apihelper
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+import metrics
+
+CONNECT_TIMEOUT = float(os.environ.get('TELEGRAM_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.environ.get('TELEGRAM_READ_TIMEOUT', '15'))
+MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', '3'))
+RETRY_BACKOFF = float(os.environ.get('TELEGRAM_RETRY_BACKOFF', '0.5'))
+MAX_RETRY_AFTER = float(os.environ.get('TELEGRAM_MAX_RETRY_AFTER', '30'))
+POOL_SIZE = int(os.environ.get('TELEGRAM_POOL_SIZE', '16'))
+API_URL = os.environ.get('TELEGRAM_API_URL', '').rstrip('/')
+
+_session = None
+_session_lock = threading.Lock()
+_bots = {}
+_bots_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def retry_delay(response, attempt: int):
+    """Пауза перед повтором в секундах; None — не повторять"""
+    if response is not None:
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get('parameters', {}).get('retry_after')
+            except ValueError:
+                retry_after = None
+            if retry_after is not None:
+                return float(retry_after) if float(retry_after) <= MAX_RETRY_AFTER else None
+        elif response.status_code < 500:
+            return None
+    return RETRY_BACKOFF * (2 ** attempt) * (0.5 + random.random() / 2)
+
+
+def request_not_sent(error: requests.ConnectionError) -> bool:
+    """True, если соединение не установилось и запрос точно не дошёл до Telegram"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+@contextmanager
+def no_retry():
+    previous = getattr(_local, 'max_retries', None)
+    _local.max_retries = 0
+    try:
+        yield
+    finally:
+        _local.max_retries = previous
+
+
+def send_request(method, url, params=None, files=None, timeout=None, proxies=None):
+    max_retries = getattr(_local, 'max_retries', None)
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    attempt = 0
+    while True:
+        try:
+            response = get_session().request(method, url, params=params, files=files,
+                                             timeout=timeout, proxies=proxies)
+        except requests.ConnectionError as e:
+            if files or attempt >= max_retries or not request_not_sent(e):
+                raise
+            response = None
+        else:
+            if response.status_code != 429 and response.status_code < 500:
+                return response
+            # Файлы уже вычитаны первой попыткой — повторять нечем
+            if files or attempt >= max_retries:
+                return response
+
+        delay = retry_delay(response, attempt)
+        if delay is None:
+            return response
+        attempt += 1
+        with metrics.phase('telegram.retry_wait'):
+            time.sleep(delay)
+
+
+def get_bot(token: str) -> telebot.TeleBot:
+    bot = _bots.get(token)
+    if bot is None:
+        with _bots_lock:
+            bot = _bots.get(token)
+            if bot is None:
+                bot = _bots[token] = telebot.TeleBot(token, threaded=False)
+    return bot
+
+
+apihelper.CUSTOM_REQUEST_SENDER = send_request
+apihelper.CONNECT_TIMEOUT = CONNECT_TIMEOUT
+apihelper.READ_TIMEOUT = READ_TIMEOUT
+if API_URL:
+    apihelper.API_URL = API_URL + '/bot{0}/{1}'
+    apihelper.FILE_URL = API_URL + '/file/bot{0}/{1}'
@@ -4,8 +4,31 @@ WebSocket функция для отслеживания координат мы
 """
 import json
 import os
-import psycopg2
 
+import db_pool
+import metrics
+import pubsub
+from recent_points import RecentPointsCache, format_point
+import session_stats
+
+recent_cache = RecentPointsCache()
+
+
+def recent_window(cursor, session_id: str, new_points: list) -> list:
+    """
+    Окно последних 10 точек: из кэша инстанса, при промахе — из БД
+    """
+    coords = recent_cache.push(session_id, new_points)
+    if coords is None:
+        cursor.execute(
+            "SELECT created_at, id, x, y FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 10",
+            (session_id,)
+        )
+        coords = recent_cache.seed(session_id, cursor.fetchall())
+    return coords
+
+
+@metrics.instrument('mouse-tracker-ws')
 def handler(event: dict, context) -> dict:
     """
     WebSocket handler для реального времени отслеживания мыши
@@ -14,15 +37,19 @@ def handler(event: dict, context) -> dict:
     event_type = request_context.get('eventType', 'MESSAGE')
     connection_id = request_context.get('connectionId', 'unknown')
     
-    print(f"Event type: {event_type}, Connection: {connection_id}")
-    
     if event_type == 'CONNECT':
+        pubsub.registry.connect(connection_id)
+        session_id = (event.get('queryStringParameters') or {}).get('sessionId')
+        if session_id:
+            pubsub.registry.subscribe(connection_id, session_id)
+            pubsub.broker.ensure_listening()
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'Connected', 'connectionId': connection_id})
         }
     
     elif event_type == 'DISCONNECT':
+        pubsub.registry.disconnect(connection_id)
         return {
             'statusCode': 200,
             'body': json.dumps({'message': 'Disconnected'})
@@ -30,100 +57,110 @@ def handler(event: dict, context) -> dict:
     
     elif event_type == 'MESSAGE':
         try:
-            dsn = os.environ.get('DATABASE_URL')
-            if not dsn:
-                return {
-                    'statusCode': 500,
-                    'body': json.dumps({'error': 'DATABASE_URL not configured'})
-                }
-            
             body = event.get('body', '{}')
             data = json.loads(body) if isinstance(body, str) else body
             action = data.get('action', 'track')
             
-            conn = psycopg2.connect(dsn)
-            cursor = conn.cursor()
-            
-            if action == 'track':
-                x = data.get('x', 0)
-                y = data.get('y', 0)
+            # Подписка и получение рассылки обходятся без БД
+            if action in ('subscribe', 'unsubscribe'):
                 session_id = data.get('sessionId', connection_id)
-                
-                cursor.execute(
-                    "INSERT INTO mouse_coords (x, y, session_id) VALUES (%s, %s, %s) RETURNING id",
-                    (x, y, session_id)
-                )
-                new_id = cursor.fetchone()[0]
-                conn.commit()
-                
-                cursor.execute(
-                    "SELECT id, x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 10",
-                    (session_id,)
-                )
-                rows = cursor.fetchall()
-                
-                coords = [{
-                    'id': row[0],
-                    'x': row[1],
-                    'y': row[2],
-                    'timestamp': row[3].isoformat() if row[3] else None
-                } for row in rows]
-                
-                cursor.close()
-                conn.close()
-                
+                if action == 'subscribe':
+                    pubsub.registry.subscribe(connection_id, session_id)
+                    pubsub.broker.ensure_listening()
+                else:
+                    pubsub.registry.unsubscribe(connection_id, session_id)
                 return {
                     'statusCode': 200,
                     'body': json.dumps({
-                        'action': 'tracked',
-                        'newId': new_id,
-                        'coordinates': coords,
-                        'total': len(coords)
+                        'action': f'{action}d',
+                        'sessionId': session_id,
+                        'coordinates': recent_cache.get(session_id) or []
                     })
                 }
             
-            elif action == 'getStats':
-                session_id = data.get('sessionId', connection_id)
-                
-                cursor.execute(
-                    "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM mouse_coords WHERE session_id = %s",
-                    (session_id,)
-                )
-                stats_row = cursor.fetchone()
-                
-                cursor.execute(
-                    "SELECT x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 50",
-                    (session_id,)
-                )
-                recent_rows = cursor.fetchall()
-                
-                recent_coords = [{
-                    'x': row[0],
-                    'y': row[1],
-                    'timestamp': row[2].isoformat() if row[2] else None
-                } for row in recent_rows]
-                
-                cursor.close()
-                conn.close()
-                
+            elif action == 'poll':
                 return {
                     'statusCode': 200,
-                    'body': json.dumps({
-                        'action': 'stats',
-                        'totalPoints': stats_row[0] if stats_row else 0,
-                        'firstPoint': stats_row[1].isoformat() if stats_row and stats_row[1] else None,
-                        'lastPoint': stats_row[2].isoformat() if stats_row and stats_row[2] else None,
-                        'recentCoordinates': recent_coords
-                    })
+                    'body': json.dumps({'action': 'pushed', 'messages': pubsub.registry.drain(connection_id)})
                 }
             
-            cursor.close()
-            conn.close()
+            dsn = os.environ.get('DATABASE_URL')
+            if not dsn:
+                return {
+                    'statusCode': 500,
+                    'body': json.dumps({'error': 'DATABASE_URL not configured'})
+                }
             
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Unknown action'})
-            }
+            with db_pool.connection(dsn) as conn, conn.cursor() as cursor:
+                if action == 'track':
+                    x = data.get('x', 0)
+                    y = data.get('y', 0)
+                    session_id = data.get('sessionId', connection_id)
+                    
+                    cursor.execute(
+                        "INSERT INTO mouse_coords (x, y, session_id) VALUES (%s, %s, %s) RETURNING created_at, id, x, y",
+                        (x, y, session_id)
+                    )
+                    new_point = cursor.fetchone()
+                    new_id = new_point[1]
+                    session_stats.record_points(cursor, session_id, [new_point])
+                    message = {
+                        'action': 'point',
+                        'sessionId': session_id,
+                        'point': format_point(new_point)
+                    }
+                    with metrics.phase('pubsub.publish'):
+                        pubsub.broker.publish(cursor, session_id, message)
+                    conn.commit()
+                    with metrics.phase('pubsub.publish'):
+                        pubsub.broker.committed(session_id, message)
+                    
+                    coords = recent_window(cursor, session_id, [new_point])
+                    response = {
+                        'action': 'tracked',
+                        'newId': new_id,
+                        'coordinates': coords,
+                        'total': len(coords)
+                    }
+                    pushed = pubsub.registry.drain(connection_id)
+                    if pushed:
+                        response['pushed'] = pushed
+                    
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps(response)
+                    }
+                
+                elif action == 'getStats':
+                    session_id = data.get('sessionId', connection_id)
+                    
+                    stats = session_stats.fetch_stats(cursor, session_id)
+                    
+                    cursor.execute(
+                        "SELECT x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 50",
+                        (session_id,)
+                    )
+                    recent_rows = cursor.fetchall()
+                    
+                    recent_coords = [{
+                        'x': row[0],
+                        'y': row[1],
+                        'timestamp': row[2].isoformat() if row[2] else None
+                    } for row in recent_rows]
+                    
+                    return {
+                        'statusCode': 200,
+                        'body': json.dumps({
+                            'action': 'stats',
+                            **stats,
+                            'recentCoordinates': recent_coords
+                        })
+                    }
+                
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'error': 'Unknown action'})
+                }
             
         except Exception as e:
             print(f"Error: {str(e)}")
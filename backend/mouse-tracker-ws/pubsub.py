@@ -0,0 +1,173 @@
+"""
+Реестр WebSocket-подключений и рассылка новых точек подписчикам сессии.
+
+Подписчики сессии получают каждую новую точку без опроса БД. Доставка идёт через transport —
+функцию send(connection_id, message) -> bool, которую задаёт среда с постоянными сокетами
+(например, scripts/local_runtime.py). Без transport сообщения копятся в ограниченной очереди
+подключения и отдаются в ответе на его следующее сообщение (поле pushed).
+
+Запись точки вызывает publish в своей транзакции до commit и committed после него.
+Брокер выбирается переменной MOUSE_PUBSUB_BACKEND:
+  local    — в памяти инстанса (по умолчанию), видит только подключения этого инстанса;
+             рассылает в committed, так что подписчики не увидят точку, чей commit не прошёл;
+  postgres — LISTEN/NOTIFY: точка уходит в pg_notify в транзакции записи и доходит
+             до подписчиков на всех инстансах, слушающих канал.
+"""
+import json
+import os
+import select
+import threading
+from collections import deque
+
+OUTBOX_SIZE = 100
+NOTIFY_CHANNEL = 'mouse_coords_points'
+
+_transport = None
+
+
+def set_transport(send) -> None:
+    """send(connection_id, message: dict) -> bool; False — подключение закрыто"""
+    global _transport
+    _transport = send
+
+
+class ConnectionRegistry:
+    def __init__(self):
+        self._sessions_by_connection = {}
+        self._connections_by_session = {}
+        self._outboxes = {}
+        self._lock = threading.Lock()
+
+    def connect(self, connection_id: str) -> None:
+        with self._lock:
+            self._sessions_by_connection.setdefault(connection_id, set())
+            self._outboxes.setdefault(connection_id, deque(maxlen=OUTBOX_SIZE))
+
+    def disconnect(self, connection_id: str) -> None:
+        with self._lock:
+            for session_id in self._sessions_by_connection.pop(connection_id, set()):
+                subscribers = self._connections_by_session.get(session_id)
+                if subscribers:
+                    subscribers.discard(connection_id)
+                    if not subscribers:
+                        del self._connections_by_session[session_id]
+            self._outboxes.pop(connection_id, None)
+
+    def subscribe(self, connection_id: str, session_id: str) -> None:
+        self.connect(connection_id)
+        with self._lock:
+            self._sessions_by_connection[connection_id].add(session_id)
+            self._connections_by_session.setdefault(session_id, set()).add(connection_id)
+
+    def unsubscribe(self, connection_id: str, session_id: str) -> None:
+        with self._lock:
+            self._sessions_by_connection.get(connection_id, set()).discard(session_id)
+            subscribers = self._connections_by_session.get(session_id)
+            if subscribers:
+                subscribers.discard(connection_id)
+                if not subscribers:
+                    del self._connections_by_session[session_id]
+
+    def subscribers(self, session_id: str) -> list:
+        with self._lock:
+            return list(self._connections_by_session.get(session_id, ()))
+
+    def enqueue(self, connection_id: str, message: dict) -> None:
+        with self._lock:
+            outbox = self._outboxes.get(connection_id)
+            if outbox is not None:
+                outbox.append(message)
+
+    def drain(self, connection_id: str) -> list:
+        with self._lock:
+            outbox = self._outboxes.get(connection_id)
+            if not outbox:
+                return []
+            messages = list(outbox)
+            outbox.clear()
+            return messages
+
+
+class LocalBroker:
+    """Рассылка внутри инстанса"""
+
+    def __init__(self, registry: ConnectionRegistry):
+        self.registry = registry
+
+    def publish(self, cursor, session_id: str, message: dict) -> None:
+        """Вызывается в транзакции записи точки, прямо перед commit"""
+
+    def committed(self, session_id: str, message: dict) -> None:
+        """Вызывается после успешного commit той же транзакции"""
+        self.deliver(session_id, message)
+
+    def ensure_listening(self) -> None:
+        pass
+
+    def deliver(self, session_id: str, message: dict) -> None:
+        for connection_id in self.registry.subscribers(session_id):
+            if _transport is None:
+                self.registry.enqueue(connection_id, message)
+            elif not _transport(connection_id, message):
+                self.registry.disconnect(connection_id)
+
+
+class PgNotifyBroker(LocalBroker):
+    """
+    pg_notify в транзакции записи: уведомление уходит только после commit.
+    Отдельный поток держит соединение с LISTEN и раздаёт точки локальным подписчикам,
+    включая подписчиков этого же инстанса
+    """
+
+    def __init__(self, registry: ConnectionRegistry, dsn: str = None):
+        super().__init__(registry)
+        self.dsn = dsn
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, cursor, session_id: str, message: dict) -> None:
+        self.ensure_listening()
+        cursor.execute(
+            "SELECT pg_notify(%s, %s)",
+            (NOTIFY_CHANNEL, json.dumps({'sessionId': session_id, 'message': message}))
+        )
+
+    def committed(self, session_id: str, message: dict) -> None:
+        """Доставку после commit делает сам PostgreSQL через LISTEN"""
+
+    def ensure_listening(self) -> None:
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='mouse-pubsub-listen', daemon=True)
+                self._listener.start()
+
+    def _listen(self) -> None:
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn or os.environ['DATABASE_URL'])
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    payload = json.loads(notify.payload)
+                    self.deliver(payload['sessionId'], payload['message'])
+        finally:
+            conn.close()
+
+
+registry = ConnectionRegistry()
+
+
+def create_broker():
+    if os.environ.get('MOUSE_PUBSUB_BACKEND', 'local') == 'postgres':
+        return PgNotifyBroker(registry)
+    return LocalBroker(registry)
+
+
+broker = create_broker()
@@ -0,0 +1,66 @@
+"""
+Кэш последних точек по сессиям в памяти тёплого инстанса.
+Окно последних 10 точек для ответа track отдаётся отсюда, в БД идём только при промахе.
+Файл одинаковый в mouse-tracker и mouse-tracker-ws — правки вносить в обе копии.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+WINDOW_SIZE = 10
+MAX_SESSIONS = int(os.environ.get('MOUSE_RECENT_CACHE_SESSIONS', '10000'))
+
+
+def format_point(point: tuple) -> dict:
+    created_at, point_id, x, y = point
+    return {
+        'id': point_id,
+        'x': x,
+        'y': y,
+        'timestamp': created_at.isoformat() if created_at else None
+    }
+
+
+class RecentPointsCache:
+    """
+    Для каждой сессии хранит не больше window точек (новые первыми),
+    сессий не больше max_sessions — самая давно использованная вытесняется.
+    Точки, записанные другими инстансами, сюда не попадают: окно видит только свои записи
+    с момента последнего промаха.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE, max_sessions: int = MAX_SESSIONS):
+        self.window = window
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self._lock:
+            points = self._sessions.get(session_id)
+            if points is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            return [format_point(p) for p in points]
+
+    def seed(self, session_id: str, points: list) -> list:
+        """Заполняет окно строками (created_at, id, x, y), прочитанными из БД"""
+        with self._lock:
+            self._store(session_id, list(points))
+            return [format_point(p) for p in self._sessions[session_id]]
+
+    def push(self, session_id: str, new_points: list):
+        """Добавляет новые точки; возвращает окно или None, если сессии нет в кэше"""
+        with self._lock:
+            points = self._sessions.get(session_id)
+            if points is None:
+                return None
+            self._store(session_id, points + list(new_points))
+            return [format_point(p) for p in self._sessions[session_id]]
+
+    def _store(self, session_id: str, points: list) -> None:
+        points.sort(key=lambda p: (p[0], p[1] or 0), reverse=True)
+        self._sessions[session_id] = points[:self.window]
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
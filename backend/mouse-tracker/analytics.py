@@ -0,0 +1,122 @@
+"""
+Аналитика по всем точкам сессии или диапазона времени, а не по выборке последних 100:
+  heatmap    — плотность точек в сетке bins_x × bins_y;
+  trajectory — путь, скорость, время остановок и простоя.
+
+Точки читаются именованным (серверным) курсором порциями по MOUSE_ANALYTICS_FETCH_SIZE строк,
+каждая порция считается векторно в NumPy — в памяти одновременно не больше одной порции.
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+
+FETCH_SIZE = int(os.environ.get('MOUSE_ANALYTICS_FETCH_SIZE', '50000'))
+MAX_BINS = 512
+DWELL_RADIUS = 3.0
+IDLE_GAP_MS = 5000.0
+
+
+def stream_points(conn, session_id: str = None, time_from: datetime = None, time_to: datetime = None,
+                  fetch_size: int = FETCH_SIZE):
+    """
+    Порции точек массивами float64 формы (n, 3): x, y, время в мс; по возрастанию времени
+    """
+    conditions, params = [], []
+    if session_id is not None:
+        conditions.append("session_id = %s")
+        params.append(session_id)
+    if time_from is not None:
+        conditions.append("created_at >= %s")
+        params.append(time_from)
+    if time_to is not None:
+        conditions.append("created_at < %s")
+        params.append(time_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with conn.cursor(name='mouse_analytics') as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(
+            "SELECT x, y, EXTRACT(EPOCH FROM created_at)::float8 * 1000 "
+            f"FROM mouse_coords {where} ORDER BY created_at",
+            params
+        )
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield np.array(rows, dtype=np.float64)
+
+
+def heatmap(chunks, bins_x: int, bins_y: int, width: float, height: float) -> dict:
+    """
+    Точки за пределами width × height прижимаются к крайним ячейкам
+    """
+    grid = np.zeros(bins_x * bins_y, dtype=np.int64)
+    total = 0
+    for chunk in chunks:
+        ix = np.clip((chunk[:, 0] * bins_x / width).astype(np.int64), 0, bins_x - 1)
+        iy = np.clip((chunk[:, 1] * bins_y / height).astype(np.int64), 0, bins_y - 1)
+        grid += np.bincount(iy * bins_x + ix, minlength=bins_x * bins_y)
+        total += len(chunk)
+    grid = grid.reshape(bins_y, bins_x)
+    return {
+        'bins': [bins_x, bins_y],
+        'width': width,
+        'height': height,
+        'total': total,
+        'max': int(grid.max()) if total else 0,
+        'grid': grid.tolist()
+    }
+
+
+def trajectory(chunks, dwell_radius: float = DWELL_RADIUS, idle_gap_ms: float = IDLE_GAP_MS) -> dict:
+    """
+    Путь в px, скорости в px/с. Отрезки длиннее idle_gap_ms по времени считаются простоем
+    и не входят в путь и скорость; отрезки короче dwell_radius px — остановкой (dwell)
+    """
+    total = 0
+    distance = dwell_ms = idle_ms = moving_ms = max_speed = 0.0
+    first_t = last_t = None
+    previous = None
+    for chunk in chunks:
+        total += len(chunk)
+        if first_t is None:
+            first_t = chunk[0, 2]
+        last_t = chunk[-1, 2]
+        # Последняя точка прошлой порции замыкает отрезок на границе порций
+        points = chunk if previous is None else np.vstack((previous, chunk))
+        previous = chunk[-1:]
+        if len(points) < 2:
+            continue
+
+        deltas = np.diff(points, axis=0)
+        lengths = np.hypot(deltas[:, 0], deltas[:, 1])
+        durations = deltas[:, 2]
+
+        idle = durations > idle_gap_ms
+        idle_ms += float(durations[idle].sum())
+        active = ~idle
+        dwell = active & (lengths < dwell_radius)
+        dwell_ms += float(durations[dwell].sum())
+
+        moving = active & ~dwell
+        distance += float(lengths[active].sum())
+        moving_ms += float(durations[moving].sum())
+        timed = active & (durations > 0)
+        if timed.any():
+            max_speed = max(max_speed, float((lengths[timed] / durations[timed]).max() * 1000))
+
+    duration_ms = float(last_t - first_t) if total else 0.0
+    active_ms = duration_ms - idle_ms
+    return {
+        'totalPoints': total,
+        'distance': round(distance, 1),
+        'durationMs': round(duration_ms),
+        'idleMs': round(idle_ms),
+        'dwellMs': round(dwell_ms),
+        'dwellRatio': round(dwell_ms / active_ms, 4) if active_ms > 0 else 0.0,
+        'avgSpeed': round(distance / active_ms * 1000, 1) if active_ms > 0 else 0.0,
+        'movingSpeed': round(distance / moving_ms * 1000, 1) if moving_ms > 0 else 0.0,
+        'maxSpeed': round(max_speed, 1)
+    }
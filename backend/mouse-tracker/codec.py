@@ -0,0 +1,165 @@
+"""
+Компактный бинарный формат потока точек (application/x-mouse-points).
+
+    'MP' | версия (1 байт) | флаги (1 байт) | [длина sessionId, sessionId utf-8] | число точек | точки
+
+Все числа — varint (LEB128), знаковые — через zigzag. Каждая точка хранится разностью
+с предыдущей: [Δid] Δx Δy [Δt]; id и t (мс с эпохи) есть, если выставлены флаги.
+Типичная точка движения мыши занимает 3–5 байт вместо ~60 в JSON. Выигрыш — в трафике, не в CPU:
+кодирование ответа и разбор запроса на чистом Python примерно в 1,7–2,3 раза медленнее модуля json
+(scripts/bench_mouse_codec.py).
+
+Поток (выгрузка export) — несколько таких кадров подряд, без разделителей: каждый кадр
+начинается заново с 'MP' и разностей от нуля. Читается decode_stream.
+"""
+from datetime import datetime, timedelta, timezone
+
+CONTENT_TYPE = 'application/x-mouse-points'
+MAGIC = b'MP'
+VERSION = 1
+FLAG_IDS = 1
+FLAG_TIMES = 2
+FLAG_SESSION = 4
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _unzigzag(value: int) -> int:
+    return (value >> 1) ^ -(value & 1)
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int) -> tuple:
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise ValueError('Truncated varint')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def timestamp_to_ms(value) -> int:
+    """ISO-строка или naive UTC datetime из БД в мс с эпохи"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MS
+
+
+def encode_points(points: list, session_id: str = None) -> bytes:
+    """
+    points — словари с x, y и необязательными id и t (мс); флаги берутся по первой точке
+    """
+    has_ids = bool(points) and points[0].get('id') is not None
+    has_times = bool(points) and points[0].get('t') is not None
+    flags = (FLAG_IDS if has_ids else 0) | (FLAG_TIMES if has_times else 0) | (FLAG_SESSION if session_id else 0)
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out.append(flags)
+    if session_id:
+        encoded_session = session_id.encode('utf-8')
+        _write_varint(out, len(encoded_session))
+        out += encoded_session
+    _write_varint(out, len(points))
+
+    prev_id = prev_x = prev_y = prev_t = 0
+    for point in points:
+        if has_ids:
+            _write_varint(out, _zigzag(point['id'] - prev_id))
+            prev_id = point['id']
+        x, y = int(point['x']), int(point['y'])
+        _write_varint(out, _zigzag(x - prev_x))
+        _write_varint(out, _zigzag(y - prev_y))
+        prev_x, prev_y = x, y
+        if has_times:
+            t = int(point['t'])
+            _write_varint(out, _zigzag(t - prev_t))
+            prev_t = t
+    return bytes(out)
+
+
+def _decode_frame(data: bytes, pos: int) -> tuple:
+    """Один кадр с позиции pos: (session_id, точки, позиция сразу за кадром)"""
+    if len(data) - pos < 4 or data[pos:pos + 2] != MAGIC:
+        raise ValueError('Not a mouse points payload')
+    if data[pos + 2] != VERSION:
+        raise ValueError(f'Unsupported mouse points version: {data[pos + 2]}')
+    flags = data[pos + 3]
+    pos += 4
+
+    session_id = None
+    if flags & FLAG_SESSION:
+        length, pos = _read_varint(data, pos)
+        if pos + length > len(data):
+            raise ValueError('Truncated sessionId')
+        session_id = data[pos:pos + length].decode('utf-8')
+        pos += length
+
+    count, pos = _read_varint(data, pos)
+    points = []
+    prev_id = prev_x = prev_y = prev_t = 0
+    for _ in range(count):
+        point = {}
+        if flags & FLAG_IDS:
+            value, pos = _read_varint(data, pos)
+            prev_id += _unzigzag(value)
+            point['id'] = prev_id
+        value, pos = _read_varint(data, pos)
+        prev_x += _unzigzag(value)
+        value, pos = _read_varint(data, pos)
+        prev_y += _unzigzag(value)
+        point['x'], point['y'] = prev_x, prev_y
+        if flags & FLAG_TIMES:
+            value, pos = _read_varint(data, pos)
+            prev_t += _unzigzag(value)
+            point['t'] = prev_t
+        points.append(point)
+    return session_id, points, pos
+
+
+def decode_points(data: bytes) -> tuple:
+    """
+    Возвращает (session_id или None, список словарей с x, y и, если есть, id и t); ValueError на мусоре
+    """
+    session_id, points, pos = _decode_frame(data, 0)
+    if pos != len(data):
+        raise ValueError(f'{len(data) - pos} trailing bytes after mouse points')
+    return session_id, points
+
+
+def decode_stream(data: bytes) -> list:
+    """
+    Точки всех кадров потока подряд (страница или файл export); ValueError на мусоре
+    """
+    points, pos = [], 0
+    while pos < len(data):
+        _, frame_points, pos = _decode_frame(data, pos)
+        points.extend(frame_points)
+    return points
+
+
+def encode_coordinates(coords: list) -> bytes:
+    """Окно coordinates из ответа track ({id, x, y, timestamp}) в бинарный вид"""
+    return encode_points([{
+        'id': c['id'],
+        'x': c['x'],
+        'y': c['y'],
+        't': timestamp_to_ms(c['timestamp']) if c.get('timestamp') else 0
+    } for c in coords])
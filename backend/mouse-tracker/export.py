@@ -0,0 +1,135 @@
+"""
+Выгрузка всех точек сессии в NDJSON, CSV или компактном бинарном формате (codec).
+
+Строки читаются именованным (серверным) курсором порциями по MOUSE_EXPORT_FETCH_SIZE,
+каждая порция сразу кодируется — память не зависит от длины сессии.
+HTTP-ответ функции — одна строка, которую страница держит целиком, поэтому action=export отдаёт
+страницы до MOUSE_EXPORT_PAGE_SIZE точек (20000 — около 1,2 МБ NDJSON) с продолжением по ключу
+(created_at, id); выгрузка без ограничений — из консоли:
+    DATABASE_URL=... python export.py SESSION_ID [--format csv] [--from ISO] [--to ISO] > session.csv
+
+Бинарный формат — поток codec: подряд идущие кадры, по одному на порцию (id, x, y, t);
+читать codec.decode_stream, decode_points видит только первый кадр.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from datetime import datetime
+
+import codec
+
+FETCH_SIZE = int(os.environ.get('MOUSE_EXPORT_FETCH_SIZE', '10000'))
+PAGE_SIZE = int(os.environ.get('MOUSE_EXPORT_PAGE_SIZE', '20000'))
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+    'binary': codec.CONTENT_TYPE
+}
+CSV_HEADER = ('id', 'x', 'y', 'timestamp')
+
+
+def parse_cursor(value: str) -> tuple:
+    """Курсор 'created_at,id' из X-Export-Next-Cursor; ValueError, если он испорчен"""
+    created_at, point_id = str(value).rsplit(',', 1)
+    return datetime.fromisoformat(created_at), int(point_id)
+
+
+def iter_chunks(conn, session_id: str, time_from: datetime = None, time_to: datetime = None,
+                after: tuple = None, limit: int = None, fetch_size: int = FETCH_SIZE):
+    """
+    Порции строк (id, x, y, created_at) по возрастанию (created_at, id)
+    """
+    conditions, params = ["session_id = %s"], [session_id]
+    if time_from is not None:
+        conditions.append("created_at >= %s")
+        params.append(time_from)
+    if time_to is not None:
+        conditions.append("created_at < %s")
+        params.append(time_to)
+    if after is not None:
+        conditions.append("(created_at, id) > (%s, %s)")
+        params.extend(after)
+    query = f"SELECT id, x, y, created_at FROM mouse_coords WHERE {' AND '.join(conditions)} ORDER BY created_at, id"
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+
+    with conn.cursor(name='mouse_export') as cursor:
+        cursor.itersize = fetch_size
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield rows
+
+
+def encode_chunk(fmt: str, rows: list, header: bool) -> bytes:
+    if fmt == 'binary':
+        return codec.encode_points([
+            {'id': row[0], 'x': row[1], 'y': row[2], 't': codec.timestamp_to_ms(row[3])} for row in rows
+        ])
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        if header:
+            writer.writerow(CSV_HEADER)
+        writer.writerows((row[0], row[1], row[2], row[3].isoformat()) for row in rows)
+        return buffer.getvalue().encode('utf-8')
+    return ''.join(
+        json.dumps({'id': row[0], 'x': row[1], 'y': row[2], 'timestamp': row[3].isoformat()},
+                   separators=(',', ':')) + '\n'
+        for row in rows
+    ).encode('utf-8')
+
+
+def write_export(conn, out, fmt: str, session_id: str, time_from: datetime = None, time_to: datetime = None,
+                 after: tuple = None, limit: int = None) -> tuple:
+    """
+    Пишет байты в out порция за порцией; возвращает (число точек, последняя строка или None)
+    """
+    count, last_row = 0, None
+    for rows in iter_chunks(conn, session_id, time_from, time_to, after, limit):
+        # Заголовок CSV — только в начале выгрузки, продолжения склеиваются без него
+        out.write(encode_chunk(fmt, rows, header=after is None and count == 0))
+        count += len(rows)
+        last_row = rows[-1]
+    return count, last_row
+
+
+def export_page(conn, fmt: str, session_id: str, time_from: datetime = None, time_to: datetime = None,
+                after: tuple = None, page_size: int = PAGE_SIZE) -> tuple:
+    """
+    Одна страница для HTTP после ключа after (parse_cursor): (байты, число точек, курсор следующей страницы или None)
+    """
+    out = io.BytesIO()
+    count, last_row = write_export(conn, out, fmt, session_id, time_from, time_to, after, page_size)
+    next_cursor = f'{last_row[3].isoformat()},{last_row[0]}' if count == page_size else None
+    return out.getvalue(), count, next_cursor
+
+
+def main() -> int:
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Выгрузка точек сессии mouse_coords')
+    parser.add_argument('session_id')
+    parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='ndjson')
+    parser.add_argument('--from', dest='time_from', type=datetime.fromisoformat)
+    parser.add_argument('--to', dest='time_to', type=datetime.fromisoformat)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        count, _ = write_export(conn, sys.stdout.buffer, args.format, args.session_id, args.time_from, args.time_to)
+        conn.rollback()
+    finally:
+        conn.close()
+    print(f'exported {count} points', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,10 +2,282 @@
 WebSocket функция для отслеживания координат мыши в реальном времени.
 Сохраняет координаты в БД и возвращает последние данные.
 """
+import base64
 import json
 import os
+from datetime import datetime, timezone
 import psycopg2
+from psycopg2.extras import execute_values
 
+import codec
+import db_pool
+import metrics
+import export
+from ingest import PointFilter
+from recent_points import RecentPointsCache, format_point
+import session_stats
+import staging
+import write_behind
+
+MAX_BATCH_SIZE = 1000
+INT4_MIN, INT4_MAX = -2 ** 31, 2 ** 31 - 1
+
+recent_cache = RecentPointsCache()
+point_filter = PointFilter()
+
+
+def parse_client_timestamp(value):
+    """
+    Переводит клиентскую метку времени (мс с эпохи или ISO-строка) в naive UTC datetime
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc).replace(tzinfo=None)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def insert_points_batch(cursor, session_id: str, points: list) -> list:
+    """
+    Записывает пачку точек одним многострочным INSERT, возвращает строки (created_at, id, x, y)
+    """
+    rows = [
+        (int(p.get('x', 0)), int(p.get('y', 0)), session_id, parse_client_timestamp(p.get('t')))
+        for p in points
+    ]
+    return execute_values(
+        cursor,
+        "INSERT INTO mouse_coords (x, y, session_id, created_at) VALUES %s RETURNING created_at, id, x, y",
+        rows,
+        template="(%s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))",
+        page_size=MAX_BATCH_SIZE,
+        fetch=True
+    )
+
+
+def stage_points_batch(cursor, session_id: str, points: list) -> None:
+    """
+    Пишет пачку в нежурналируемую mouse_coords_staging, id и статистика появятся при переносе
+    """
+    rows = [
+        (int(p.get('x', 0)), int(p.get('y', 0)), session_id, parse_client_timestamp(p.get('t')))
+        for p in points
+    ]
+    execute_values(
+        cursor,
+        "INSERT INTO mouse_coords_staging (x, y, session_id, created_at) VALUES %s",
+        rows,
+        template="(%s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))",
+        page_size=MAX_BATCH_SIZE
+    )
+
+
+def validate_point(point) -> str:
+    """
+    Причина, по которой точку нельзя записать, или None: кривые x, y, t — это 400, а не 500 из INSERT,
+    а в write-behind ошибку надо поймать до постановки в очередь — после ответа 200 сообщить о ней
+    клиенту уже некому
+    """
+    if not isinstance(point, dict):
+        return 'point must be an object'
+    for key in ('x', 'y'):
+        try:
+            value = int(point.get(key, 0))
+        except (TypeError, ValueError, OverflowError):
+            return f'{key} must be an integer'
+        if not INT4_MIN <= value <= INT4_MAX:
+            return f'{key} is out of range'
+    try:
+        parse_client_timestamp(point.get('t'))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return 't must be milliseconds since epoch or an ISO 8601 string'
+    return None
+
+
+def validate_points(action: str, points: list) -> str:
+    """
+    Первая ошибка среди точек track/trackBatch (у trackBatch — с индексом точки) или None
+    """
+    for i, point in enumerate(points):
+        error = validate_point(point)
+        if error:
+            return f'points[{i}]: {error}' if action == 'trackBatch' else error
+    return None
+
+
+def write_points(cursor, session_id: str, points: list) -> list:
+    """
+    Записывает точки и учитывает их в статистике сессии; возвращает новые строки (created_at, id, x, y).
+    При MOUSE_INGEST_TARGET=staging точки уходят в staging и строк ещё нет — возвращается []
+    """
+    if not points:
+        return []
+    if staging.ENABLED:
+        stage_points_batch(cursor, session_id, points)
+        return []
+    new_points = insert_points_batch(cursor, session_id, points)
+    session_stats.record_points(cursor, session_id, new_points)
+    return new_points
+
+
+def fetch_recent_points(cursor, session_id: str) -> list:
+    """
+    Последние 10 точек сессии из БД строками (created_at, id, x, y)
+    """
+    cursor.execute(
+        "SELECT created_at, id, x, y FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 10",
+        (session_id,)
+    )
+    return cursor.fetchall()
+
+
+def recent_window(cursor, session_id: str, new_points: list) -> list:
+    """
+    Окно последних точек в формате ответа track: из кэша инстанса, при промахе — из БД.
+    При MOUSE_INGEST_TARGET=staging кэш не используется: точки появляются в mouse_coords при переносе,
+    мимо этого инстанса, и окно каждый раз читается из БД
+    """
+    if staging.ENABLED:
+        return [format_point(p) for p in fetch_recent_points(cursor, session_id)]
+    coords = recent_cache.push(session_id, new_points)
+    if coords is None:
+        coords = recent_cache.seed(session_id, fetch_recent_points(cursor, session_id))
+    return coords
+
+
+def write_batches(batches: list) -> None:
+    """
+    Запись из очереди write-behind: все сессии пачки в одной транзакции, затем фильтр и окна в кэше
+    """
+    with db_pool.connection(os.environ['DATABASE_URL']) as conn, conn.cursor() as cursor:
+        written = []
+        for session_id, points in batches:
+            new_points = write_points(cursor, session_id, points)
+            written.append((session_id, new_points))
+        conn.commit()
+        for session_id, points in batches:
+            point_filter.remember(session_id, points)
+        if staging.ENABLED:
+            return
+        for session_id, new_points in written:
+            recent_window(cursor, session_id, new_points)
+
+
+def is_data_error(error: Exception) -> bool:
+    """Ошибка из-за самих точек: повтор не поможет, порция уходит в dead-letter"""
+    return isinstance(error, (psycopg2.DataError, psycopg2.IntegrityError, ValueError, TypeError))
+
+
+write_queue = (
+    write_behind.WriteBehindQueue(write_batches, is_data_error=is_data_error) if write_behind.ENABLED else None
+)
+
+
+def negotiate_format(event: dict) -> tuple:
+    """
+    (бинарный запрос, бинарный ответ): запрос — по Content-Type, ответ — по Accept или ?format=binary
+    """
+    request_headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    params = event.get('queryStringParameters') or {}
+    binary_request = request_headers.get('content-type', '').startswith(codec.CONTENT_TYPE)
+    binary_response = (
+        binary_request
+        or params.get('format') == 'binary'
+        or codec.CONTENT_TYPE in request_headers.get('accept', '')
+    )
+    return binary_request, binary_response
+
+
+def decode_binary_request(event: dict) -> dict:
+    """
+    Бинарное тело — всегда пачка точек (trackBatch); sessionId берётся из самого тела
+    """
+    session_id, points = codec.decode_points(base64.b64decode(event.get('body') or ''))
+    return {
+        'action': (event.get('queryStringParameters') or {}).get('action', 'trackBatch'),
+        'sessionId': session_id or 'default',
+        'points': points
+    }
+
+
+@metrics.timed('serialize')
+def tracked_response(headers: dict, payload: dict, binary: bool) -> dict:
+    """
+    Ответ track/trackBatch: JSON или окно точек в codec, счётчики — в заголовках X-Mouse-*
+    """
+    if not binary:
+        return {
+            'statusCode': 200,
+            'headers': headers,
+            'body': json.dumps(payload)
+        }
+    counters = {
+        f'X-Mouse-{key.capitalize()}': str(int(payload[key]))
+        for key in ('inserted', 'queued', 'coalesced') if key in payload
+    }
+    return {
+        'statusCode': 200,
+        'headers': {
+            **headers,
+            **counters,
+            'Content-Type': codec.CONTENT_TYPE,
+            'Access-Control-Expose-Headers': 'X-Mouse-Inserted, X-Mouse-Queued, X-Mouse-Coalesced'
+        },
+        'body': base64.b64encode(codec.encode_coordinates(payload['coordinates'])).decode('ascii'),
+        'isBase64Encoded': True
+    }
+
+
+def track_write_behind(headers: dict, action: str, data: dict, binary: bool) -> dict:
+    """
+    track/trackBatch в режиме write-behind: точки ставятся в очередь, БД не трогается;
+    окно — то, что уже записано и есть в кэше инстанса
+    """
+    session_id = data.get('sessionId', 'default')
+    if action == 'track':
+        points = [{'x': data.get('x', 0), 'y': data.get('y', 0)}]
+    else:
+        points = data.get('points') or []
+        if not isinstance(points, list) or len(points) > MAX_BATCH_SIZE:
+            return {
+                'statusCode': 400,
+                'headers': headers,
+                'body': json.dumps({'error': f'points must be a list of at most {MAX_BATCH_SIZE} items'})
+            }
+    
+    error = validate_points(action, points)
+    if error:
+        return {
+            'statusCode': 400,
+            'headers': headers,
+            'body': json.dumps({'error': error})
+        }
+    
+    accepted = point_filter.apply(session_id, points)
+    try:
+        with metrics.phase('queue.enqueue'):
+            queued = write_queue.enqueue(session_id, accepted)
+    except write_behind.QueueFull as e:
+        return {
+            'statusCode': 503,
+            'headers': {**headers, 'Retry-After': '1'},
+            'body': json.dumps({'error': f'Write queue is full: {e}'})
+        }
+    
+    coords = recent_cache.get(session_id) or []
+    return tracked_response(headers, {
+        'action': 'tracked',
+        'queued': queued,
+        'coalesced': len(points) - queued,
+        'coordinates': coords,
+        'total': len(coords)
+    }, binary)
+
+
+@metrics.instrument('mouse-tracker')
 def handler(event: dict, context) -> dict:
     """
     WebSocket handler для отслеживания координат мыши
@@ -35,96 +307,217 @@ def handler(event: dict, context) -> dict:
                 'body': json.dumps({'error': 'DATABASE_URL not configured'})
             }
         
-        conn = psycopg2.connect(dsn)
-        cursor = conn.cursor()
-        
-        body = event.get('body', '{}')
-        data = json.loads(body) if isinstance(body, str) else body
+        binary_request, binary_response = negotiate_format(event)
+        if binary_request:
+            try:
+                data = decode_binary_request(event)
+            except ValueError as e:
+                return {
+                    'statusCode': 400,
+                    'headers': headers,
+                    'body': json.dumps({'error': f'Invalid binary payload: {e}'})
+                }
+        else:
+            body = event.get('body', '{}')
+            data = json.loads(body) if isinstance(body, str) else body
         
         action = data.get('action', 'track')
         
-        if action == 'track':
-            x = data.get('x', 0)
-            y = data.get('y', 0)
-            session_id = data.get('sessionId', 'default')
-            
-            cursor.execute(
-                "INSERT INTO mouse_coords (x, y, session_id) VALUES (%s, %s, %s)",
-                (x, y, session_id)
-            )
-            conn.commit()
-            
-            cursor.execute(
-                "SELECT id, x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 10",
-                (session_id,)
-            )
-            rows = cursor.fetchall()
-            
-            coords = [{
-                'id': row[0],
-                'x': row[1],
-                'y': row[2],
-                'timestamp': row[3].isoformat() if row[3] else None
-            } for row in rows]
-            
-            cursor.close()
-            conn.close()
-            
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps({
+        if write_queue is not None and action in ('track', 'trackBatch'):
+            return track_write_behind(headers, action, data, binary_response)
+        
+        with db_pool.connection(dsn) as conn, conn.cursor() as cursor:
+            if action == 'track':
+                session_id = data.get('sessionId', 'default')
+                # Одиночная точка — последняя в своей пачке, фильтр её не отбрасывает
+                points = [{'x': data.get('x', 0), 'y': data.get('y', 0)}]
+                error = validate_points(action, points)
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': error})
+                    }
+                
+                new_points = write_points(cursor, session_id, points)
+                conn.commit()
+                point_filter.remember(session_id, points)
+                
+                coords = recent_window(cursor, session_id, new_points)
+                
+                return tracked_response(headers, {
                     'action': 'tracked',
                     'coordinates': coords,
                     'total': len(coords)
-                })
-            }
-        
-        elif action == 'getStats':
-            session_id = data.get('sessionId', 'default')
+                }, binary_response)
             
-            cursor.execute(
-                "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM mouse_coords WHERE session_id = %s",
-                (session_id,)
-            )
-            stats_row = cursor.fetchone()
+            elif action == 'trackBatch':
+                session_id = data.get('sessionId', 'default')
+                points = data.get('points') or []
+                
+                if not isinstance(points, list) or len(points) > MAX_BATCH_SIZE:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': f'points must be a list of at most {MAX_BATCH_SIZE} items'})
+                    }
+                
+                error = validate_points(action, points)
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': error})
+                    }
+                
+                accepted = point_filter.apply(session_id, points)
+                new_points = write_points(cursor, session_id, accepted)
+                conn.commit()
+                point_filter.remember(session_id, accepted)
+                
+                coords = recent_window(cursor, session_id, new_points)
+                
+                return tracked_response(headers, {
+                    'action': 'tracked',
+                    'inserted': len(accepted),
+                    'coalesced': len(points) - len(accepted),
+                    'coordinates': coords,
+                    'total': len(coords)
+                }, binary_response)
             
-            cursor.execute(
-                "SELECT x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 100",
-                (session_id,)
-            )
-            recent_rows = cursor.fetchall()
+            elif action in ('heatmap', 'trajectory'):
+                # numpy грузится только здесь: track и OPTIONS не платят за него на холодном старте
+                import analytics
+                
+                session_id = data.get('sessionId')
+                time_from = parse_client_timestamp(data.get('from'))
+                time_to = parse_client_timestamp(data.get('to'))
+                
+                if action == 'trajectory' and not session_id:
+                    error = 'sessionId is required'
+                elif not session_id and not (time_from and time_to):
+                    error = 'Pass sessionId or from and to'
+                else:
+                    error = None
+                
+                if action == 'heatmap' and not error:
+                    bins_x = int(data.get('binsX', 64))
+                    bins_y = int(data.get('binsY', 36))
+                    width = float(data.get('width', 1920))
+                    height = float(data.get('height', 1080))
+                    if not (0 < bins_x <= analytics.MAX_BINS and 0 < bins_y <= analytics.MAX_BINS):
+                        error = f'binsX and binsY must be between 1 and {analytics.MAX_BINS}'
+                    elif width <= 0 or height <= 0:
+                        error = 'width and height must be positive'
+                
+                if error:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({'error': error})
+                    }
+                
+                chunks = analytics.stream_points(conn, session_id, time_from, time_to)
+                with metrics.phase('analytics'):
+                    if action == 'heatmap':
+                        result = analytics.heatmap(chunks, bins_x, bins_y, width, height)
+                    else:
+                        result = analytics.trajectory(chunks)
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({
+                        'action': action,
+                        'sessionId': session_id,
+                        **result
+                    })
+                }
             
-            recent_coords = [{
-                'x': row[0],
-                'y': row[1],
-                'timestamp': row[2].isoformat() if row[2] else None
-            } for row in recent_rows]
+            elif action == 'export':
+                session_id = data.get('sessionId')
+                fmt = data.get('format') or ('binary' if binary_response else 'ndjson')
+                
+                if not session_id or fmt not in export.CONTENT_TYPES:
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({
+                            'error': f"sessionId is required, format is one of {', '.join(sorted(export.CONTENT_TYPES))}"
+                        })
+                    }
+                
+                try:
+                    after = export.parse_cursor(data['cursor']) if data.get('cursor') else None
+                    time_from = parse_client_timestamp(data.get('from'))
+                    time_to = parse_client_timestamp(data.get('to'))
+                except (TypeError, ValueError, OverflowError, OSError):
+                    return {
+                        'statusCode': 400,
+                        'headers': headers,
+                        'body': json.dumps({
+                            'error': 'cursor must be a value of X-Export-Next-Cursor, from and to timestamps'
+                        })
+                    }
+                
+                with metrics.phase('export'):
+                    payload, count, next_cursor = export.export_page(conn, fmt, session_id, time_from, time_to, after)
+                
+                export_headers = {
+                    **headers,
+                    'Content-Type': export.CONTENT_TYPES[fmt],
+                    'X-Export-Count': str(count),
+                    'Access-Control-Expose-Headers': 'X-Export-Count, X-Export-Next-Cursor'
+                }
+                if next_cursor:
+                    export_headers['X-Export-Next-Cursor'] = next_cursor
+                
+                if fmt == 'binary':
+                    return {
+                        'statusCode': 200,
+                        'headers': export_headers,
+                        'body': base64.b64encode(payload).decode('ascii'),
+                        'isBase64Encoded': True
+                    }
+                return {
+                    'statusCode': 200,
+                    'headers': export_headers,
+                    'body': payload.decode('utf-8')
+                }
             
-            cursor.close()
-            conn.close()
+            elif action == 'getStats':
+                session_id = data.get('sessionId', 'default')
+                
+                stats = session_stats.fetch_stats(cursor, session_id)
+                
+                cursor.execute(
+                    "SELECT x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 100",
+                    (session_id,)
+                )
+                recent_rows = cursor.fetchall()
+                
+                recent_coords = [{
+                    'x': row[0],
+                    'y': row[1],
+                    'timestamp': row[2].isoformat() if row[2] else None
+                } for row in recent_rows]
+                
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps({
+                        'action': 'stats',
+                        **stats,
+                        'recentCoordinates': recent_coords
+                    })
+                }
             
             return {
-                'statusCode': 200,
+                'statusCode': 400,
                 'headers': headers,
-                'body': json.dumps({
-                    'action': 'stats',
-                    'totalPoints': stats_row[0] if stats_row else 0,
-                    'firstPoint': stats_row[1].isoformat() if stats_row and stats_row[1] else None,
-                    'lastPoint': stats_row[2].isoformat() if stats_row and stats_row[2] else None,
-                    'recentCoordinates': recent_coords
-                })
+                'body': json.dumps({'error': 'Unknown action'})
             }
         
-        cursor.close()
-        conn.close()
-        
-        return {
-            'statusCode': 400,
-            'headers': headers,
-            'body': json.dumps({'error': 'Unknown action'})
-        }
-        
     except Exception as e:
         return {
             'statusCode': 500,
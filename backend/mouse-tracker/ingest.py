@@ -0,0 +1,131 @@
+"""
+Прореживание точек перед записью: большая часть событий mousemove — сдвиги на доли пикселя
+или несколько событий в одну миллисекунду, они не меняют траекторию.
+Последняя точка пачки сохраняется всегда — это место, где курсор остановился, поэтому одиночный
+track не прореживается.
+
+Настройки (0 — шаг выключен):
+  MOUSE_COALESCE_WINDOW_MS — точки сессии ближе по времени, чем окно от начала окна, сливаются:
+                             в пачке остаётся последняя, между запросами лишние отбрасываются;
+  MOUSE_MIN_DISTANCE       — точки ближе этого расстояния (px) к последней принятой отбрасываются;
+  MOUSE_RDP_EPSILON        — упрощение пачки алгоритмом Рамера — Дугласа — Пекера с допуском (px).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+COALESCE_WINDOW_MS = float(os.environ.get('MOUSE_COALESCE_WINDOW_MS', '0'))
+MIN_DISTANCE = float(os.environ.get('MOUSE_MIN_DISTANCE', '0'))
+RDP_EPSILON = float(os.environ.get('MOUSE_RDP_EPSILON', '0'))
+MAX_SESSIONS = int(os.environ.get('MOUSE_RECENT_CACHE_SESSIONS', '10000'))
+
+
+def timestamp_ms(value) -> float:
+    """Клиентская метка (мс с эпохи или ISO-строка) в мс; без метки — время приёма"""
+    if value is None:
+        return time.time() * 1000
+    if isinstance(value, (int, float)):
+        return float(value)
+    parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp() * 1000
+
+
+def _distance_to_segment(p: tuple, a: tuple, b: tuple) -> float:
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    if dx == 0 and dy == 0:
+        return math.hypot(p[0] - a[0], p[1] - a[1])
+    return abs(dy * p[0] - dx * p[1] + b[0] * a[1] - b[1] * a[0]) / math.hypot(dx, dy)
+
+
+def simplify_rdp(points: list, epsilon: float) -> list:
+    """
+    Рамер — Дуглас — Пекер без рекурсии; points — словари с x, y, крайние точки сохраняются
+    """
+    if len(points) < 3:
+        return points
+    coords = [(p['x'], p['y']) for p in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        max_distance, index = 0.0, None
+        for i in range(start + 1, end):
+            distance = _distance_to_segment(coords[i], coords[start], coords[end])
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if index is not None and max_distance > epsilon:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [p for p, kept in zip(points, keep) if kept]
+
+
+class PointFilter:
+    """
+    Хранит последнюю записанную точку каждой сессии (LRU по сессиям), чтобы прореживать начало
+    следующей пачки. apply состояние не меняет: его обновляет remember после успешной записи,
+    иначе откаченная запись отбрасывала бы следующие точки
+    """
+
+    def __init__(self, window_ms: float = COALESCE_WINDOW_MS, min_distance: float = MIN_DISTANCE,
+                 rdp_epsilon: float = RDP_EPSILON, max_sessions: int = MAX_SESSIONS):
+        self.window_ms = window_ms
+        self.min_distance = min_distance
+        self.rdp_epsilon = rdp_epsilon
+        self.max_sessions = max_sessions
+        self._last = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.window_ms or self.min_distance or self.rdp_epsilon)
+
+    def apply(self, session_id: str, points: list) -> list:
+        """
+        points — словари с x, y и необязательной меткой t; возвращает оставшиеся в исходном порядке
+        """
+        if not self.enabled or not points:
+            return points
+
+        with self._lock:
+            last = self._last.get(session_id)
+
+        kept = []
+        final = len(points) - 1
+        for i, point in enumerate(points):
+            x, y, t = point.get('x', 0), point.get('y', 0), timestamp_ms(point.get('t'))
+            if last is not None:
+                close_in_time = self.window_ms and t - last[2] < self.window_ms
+                close_in_space = self.min_distance and math.hypot(x - last[0], y - last[1]) < self.min_distance
+                if close_in_time and not close_in_space and kept:
+                    # Та же временная корзина: остаётся последнее положение, начало окна не сдвигается
+                    kept[-1] = point
+                    last = (x, y, last[2])
+                    continue
+                if (close_in_time or close_in_space) and i != final:
+                    continue
+            kept.append(point)
+            last = (x, y, t)
+
+        if self.rdp_epsilon:
+            kept = simplify_rdp(kept, self.rdp_epsilon)
+        return kept
+
+    def remember(self, session_id: str, points: list) -> None:
+        """
+        Запоминает последнюю из записанных точек сессии; вызывать после коммита
+        """
+        if not self.enabled or not points:
+            return
+        point = points[-1]
+        with self._lock:
+            self._last[session_id] = (point.get('x', 0), point.get('y', 0), timestamp_ms(point.get('t')))
+            self._last.move_to_end(session_id)
+            while len(self._last) > self.max_sessions:
+                self._last.popitem(last=False)
@@ -0,0 +1,220 @@
+"""
+Замеры задержек по фазам обработчика: сколько времени запрос провёл в получении соединения,
+SQL, commit, сериализации, внешних API.
+
+    @metrics.instrument('photo-gallery')        — обёртка handler: общее время и строка лога на запрос
+    with metrics.phase('serialize'): ...         — фаза внутри запроса (время фазы за запрос суммируется)
+    @metrics.timed('telegram.api')               — то же для функции целиком
+
+db_pool сам отмечает фазы db.connect, db.acquire, db.query и db.commit.
+Фаза учитывает только собственное время: вложенные фазы (db.query внутри export, db.connect
+внутри db.acquire) из неё вычитаются, поэтому фазы не пересекаются и other_ms = total_ms − их сумма.
+Длительности копятся в гистограммах инстанса с логарифмически-линейными корзинами (как в HDR
+Histogram: 16 корзин на каждую степень двойки, погрешность перцентилей ~6%) в микросекундах.
+
+Вывод:
+  METRICS_LOG=1 (по умолчанию) — JSON-строка в лог на каждый запрос ({"metric": "request", ...})
+      и сводка перцентилей не чаще раза в METRICS_SUMMARY_INTERVAL секунд ({"metric": "summary", ...});
+  METRICS_ENDPOINT=1 — GET ?action=metrics отдаёт ту же сводку JSON-ом.
+Файл одинаковый во всех функциях — правки вносить во все копии.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+LOG_ENABLED = os.environ.get('METRICS_LOG', '1') == '1'
+ENDPOINT_ENABLED = os.environ.get('METRICS_ENDPOINT', '0') == '1'
+SUMMARY_INTERVAL = float(os.environ.get('METRICS_SUMMARY_INTERVAL', '60'))
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+class Histogram:
+    """
+    Счётчики по корзинам: значения меньше 16 мкс — точно, дальше 16 корзин на степень двойки
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def _highest_value(index: int) -> int:
+        if index < SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+        return ((mantissa + 1) << shift) - 1
+
+    def record(self, value_us: int) -> None:
+        value_us = max(int(value_us), 0)
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value_us
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = max(self.max, value_us)
+
+    def percentile(self, q: float) -> int:
+        if not self.count:
+            return 0
+        target = max(1, round(self.count * q / 100))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._highest_value(index), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        """Сводка в миллисекундах"""
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count / 1000, 3) if self.count else 0,
+            'min_ms': round((self.min or 0) / 1000, 3),
+            'p50_ms': round(self.percentile(50) / 1000, 3),
+            'p90_ms': round(self.percentile(90) / 1000, 3),
+            'p99_ms': round(self.percentile(99) / 1000, 3),
+            'p999_ms': round(self.percentile(99.9) / 1000, 3),
+            'max_ms': round(self.max / 1000, 3)
+        }
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.function = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_summary = time.monotonic()
+
+    def record(self, name: str, duration_ns: int) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.record(duration_ns // 1000)
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Внутри запроса время фазы суммируется и попадает в гистограмму один раз по завершении запроса;
+        вне запроса (фоновые потоки) каждый замер записывается сразу.
+        Записывается время без вложенных фаз — их длительность копится на стеке потока
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0)
+        started = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter_ns() - started
+            exclusive = elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            phases = getattr(self._local, 'phases', None)
+            if phases is None:
+                self.record(name, exclusive)
+            else:
+                phases[name] = phases.get(name, 0) + exclusive
+
+    def timed(self, name: str):
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: h.snapshot() for name, h in sorted(self.histograms.items())}
+
+    def instrument(self, function: str):
+        """Декоратор handler(event, context)"""
+        self.function = function
+
+        def decorator(handler):
+            @functools.wraps(handler)
+            def wrapper(event: dict, context):
+                params = event.get('queryStringParameters') or {}
+                if ENDPOINT_ENABLED and params.get('action') == 'metrics':
+                    return metrics_response(self.snapshot())
+
+                previous = getattr(self._local, 'phases', None)
+                self._local.phases = {}
+                started = time.perf_counter_ns()
+                response = None
+                try:
+                    response = handler(event, context)
+                    return response
+                finally:
+                    elapsed = time.perf_counter_ns() - started
+                    phases = self._local.phases
+                    self._local.phases = previous
+                    self._finish(event, response, elapsed, phases)
+            return wrapper
+        return decorator
+
+    def _finish(self, event: dict, response, elapsed_ns: int, phases: dict) -> None:
+        self.record('request', elapsed_ns)
+        for name, duration in phases.items():
+            self.record(name, duration)
+        if not LOG_ENABLED:
+            return
+
+        request_context = event.get('requestContext') or {}
+        line = {
+            'metric': 'request',
+            'function': self.function,
+            'method': event.get('httpMethod'),
+            'event': request_context.get('eventType'),
+            'connection': request_context.get('connectionId'),
+            'status': response.get('statusCode') if isinstance(response, dict) else None,
+            'total_ms': round(elapsed_ns / 1e6, 3),
+            'phases_ms': {name: round(duration / 1e6, 3) for name, duration in phases.items()},
+            'other_ms': round(max(elapsed_ns - sum(phases.values()), 0) / 1e6, 3)
+        }
+        print(json.dumps({k: v for k, v in line.items() if v is not None}, separators=(',', ':')))
+
+        now = time.monotonic()
+        if now - self._last_summary >= SUMMARY_INTERVAL:
+            self._last_summary = now
+            print(json.dumps({'metric': 'summary', 'function': self.function, 'histograms': self.snapshot()},
+                             separators=(',', ':')))
+
+
+def metrics_response(snapshot: dict) -> dict:
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Cache-Control': 'no-store'
+        },
+        'isBase64Encoded': False,
+        'body': json.dumps({'function': registry.function, 'histograms': snapshot})
+    }
+
+
+registry = Registry()
+phase = registry.phase
+timed = registry.timed
+instrument = registry.instrument
+snapshot = registry.snapshot
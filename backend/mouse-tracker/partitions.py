@@ -0,0 +1,55 @@
+"""
+Обслуживание дневных партиций mouse_coords (см. db_migrations/V0006).
+Заранее создаёт партиции на days_ahead дней вперёд и удаляет (или архивирует)
+партиции старше срока хранения целиком, без DELETE и последующего VACUUM.
+Статистика сессий, потерявших точки, пересчитывается по оставшимся (db_migrations/V0014).
+
+Запуск по расписанию, например раз в сутки:
+    DATABASE_URL=... python partitions.py [--days-ahead 7] [--retention-days 30] [--archive]
+"""
+import argparse
+import os
+import sys
+
+DAYS_AHEAD = int(os.environ.get('MOUSE_COORDS_DAYS_AHEAD', '7'))
+RETENTION_DAYS = int(os.environ.get('MOUSE_COORDS_RETENTION_DAYS', '30'))
+
+
+def maintain(cursor, days_ahead: int = DAYS_AHEAD, retention_days: int = RETENTION_DAYS,
+             archive: bool = False) -> list:
+    """
+    Возвращает список (action, partition_name): created / dropped / archived
+    """
+    cursor.execute(
+        "SELECT action, partition_name FROM mouse_coords_maintain(%s, %s, %s)",
+        (days_ahead, retention_days, archive)
+    )
+    return cursor.fetchall()
+
+
+def main() -> int:
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Обслуживание партиций mouse_coords')
+    parser.add_argument('--days-ahead', type=int, default=DAYS_AHEAD)
+    parser.add_argument('--retention-days', type=int, default=RETENTION_DAYS)
+    parser.add_argument('--archive', action='store_true',
+                        help='отсоединять просроченные партиции как mouse_coords_archive_YYYYMMDD вместо удаления')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cursor:
+            changes = maintain(cursor, args.days_ahead, args.retention_days, args.archive)
+        conn.commit()
+    finally:
+        conn.close()
+
+    for action, partition_name in changes:
+        print(f'{action}: {partition_name}')
+    print(f'Partitions changed: {len(changes)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""
+Сводная статистика по сессиям в таблице mouse_session_stats.
+track обновляет строку сессии в той же транзакции, что и INSERT точек,
+getStats читает одну строку по первичному ключу.
+Статистика описывает точки, которые сейчас есть в mouse_coords, а не всё записанное за жизнь сессии:
+mouse_coords_maintain (partitions.py) пересчитывает сессии, потерявшие точки с истёкшими партициями,
+и удаляет опустевшие — так же, как repair.
+Файл одинаковый в mouse-tracker и mouse-tracker-ws — правки вносить в обе копии.
+
+Пересчёт из mouse_coords (после ручных правок данных или сбоев):
+    DATABASE_URL=... python session_stats.py [--session SESSION_ID]
+"""
+import argparse
+import os
+import sys
+
+
+def record_points(cursor, session_id: str, points: list) -> None:
+    """
+    Учитывает новые строки (created_at, id, x, y) в статистике сессии
+    """
+    if not points:
+        return
+    timestamps = [p[0] for p in points]
+    cursor.execute(
+        """
+        INSERT INTO mouse_session_stats (session_id, total_points, first_point, last_point)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (session_id) DO UPDATE SET
+            total_points = mouse_session_stats.total_points + EXCLUDED.total_points,
+            first_point = LEAST(mouse_session_stats.first_point, EXCLUDED.first_point),
+            last_point = GREATEST(mouse_session_stats.last_point, EXCLUDED.last_point)
+        """,
+        (session_id, len(points), min(timestamps), max(timestamps))
+    )
+
+
+def fetch_stats(cursor, session_id: str) -> dict:
+    """
+    Статистика сессии в формате ответа getStats
+    """
+    cursor.execute(
+        "SELECT total_points, first_point, last_point FROM mouse_session_stats WHERE session_id = %s",
+        (session_id,)
+    )
+    row = cursor.fetchone()
+    return {
+        'totalPoints': row[0] if row else 0,
+        'firstPoint': row[1].isoformat() if row and row[1] else None,
+        'lastPoint': row[2].isoformat() if row and row[2] else None
+    }
+
+
+def repair(cursor, session_id: str = None) -> int:
+    """
+    Пересчитывает статистику из mouse_coords: одну сессию или все.
+    Возвращает число обновлённых сессий
+    """
+    cursor.execute("LOCK TABLE mouse_session_stats IN SHARE ROW EXCLUSIVE MODE")
+    session_filter = "WHERE session_id = %s" if session_id else "WHERE session_id IS NOT NULL"
+    params = (session_id,) if session_id else ()
+
+    cursor.execute(
+        f"""
+        INSERT INTO mouse_session_stats (session_id, total_points, first_point, last_point)
+        SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at)
+        FROM mouse_coords
+        {session_filter}
+        GROUP BY session_id
+        ON CONFLICT (session_id) DO UPDATE SET
+            total_points = EXCLUDED.total_points,
+            first_point = EXCLUDED.first_point,
+            last_point = EXCLUDED.last_point
+        """,
+        params
+    )
+    updated = cursor.rowcount
+
+    cursor.execute(
+        f"""
+        DELETE FROM mouse_session_stats s
+        {session_filter.replace('session_id', 's.session_id')}
+          AND NOT EXISTS (SELECT 1 FROM mouse_coords c WHERE c.session_id = s.session_id)
+        """,
+        params
+    )
+    return updated + cursor.rowcount
+
+
+def main() -> int:
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Пересчёт mouse_session_stats из mouse_coords')
+    parser.add_argument('--session', help='пересчитать только эту сессию')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cursor:
+            updated = repair(cursor, args.session)
+        conn.commit()
+    finally:
+        conn.close()
+
+    print(f'Sessions repaired: {updated}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
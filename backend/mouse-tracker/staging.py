@@ -0,0 +1,68 @@
+"""
+Перенос точек из mouse_coords_staging в mouse_coords (см. db_migrations/V0012).
+
+При MOUSE_INGEST_TARGET=staging track и trackBatch пишут в нежурналируемую таблицу без индексов,
+а точки попадают в mouse_coords, окно track и mouse_session_stats только после переноса.
+Окно track в этом режиме читается из mouse_coords на каждый запрос: кэш инстанса не видит
+перенесённых строк (вместе с write-behind окно пустое — тот режим БД на track не читает).
+Каждый перенос — одна транзакция на batch_size строк, отсортированных по (session_id, created_at).
+После аварийного перезапуска PostgreSQL нежурналируемая таблица очищается: теряются точки,
+не перенесённые к этому моменту, поэтому интервал запуска — это и окно возможной потери.
+
+Запуск по расписанию или постоянным процессом:
+    DATABASE_URL=... python staging.py [--batch-size 50000] [--loop --interval 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+ENABLED = os.environ.get('MOUSE_INGEST_TARGET', 'direct') == 'staging'
+BATCH_SIZE = int(os.environ.get('MOUSE_STAGING_MERGE_BATCH', '50000'))
+
+
+def merge(cursor, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Переносит не больше batch_size строк; возвращает, сколько перенесено
+    """
+    cursor.execute("SELECT mouse_coords_merge_staging(%s)", (batch_size,))
+    return cursor.fetchone()[0]
+
+
+def merge_all(conn, batch_size: int = BATCH_SIZE) -> int:
+    """Переносит пачками, пока staging не опустеет; каждая пачка коммитится отдельно"""
+    total = 0
+    while True:
+        with conn.cursor() as cursor:
+            merged = merge(cursor, batch_size)
+        conn.commit()
+        total += merged
+        if merged < batch_size:
+            return total
+
+
+def main() -> int:
+    import psycopg2
+
+    parser = argparse.ArgumentParser(description='Перенос mouse_coords_staging в mouse_coords')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--loop', action='store_true', help='не завершаться, переносить каждые --interval секунд')
+    parser.add_argument('--interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        while True:
+            started = time.monotonic()
+            merged = merge_all(conn, args.batch_size)
+            print(f'Points merged: {merged} in {time.monotonic() - started:.2f}s')
+            if not args.loop:
+                break
+            time.sleep(args.interval)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+Отложенная запись точек (write-behind), включается MOUSE_WRITE_BEHIND=1.
+
+track/trackBatch кладут точки в ограниченную очередь инстанса и отвечают сразу, не дожидаясь
+INSERT и commit; фоновый поток пишет накопленное пачками — как только набралось
+MOUSE_WRITE_BEHIND_BATCH_SIZE точек или прошло MOUSE_WRITE_BEHIND_FLUSH_MS.
+
+Гарантия — «хотя бы один раз»:
+  - каждая порция до постановки в очередь дописывается в spool-файл (MOUSE_WRITE_BEHIND_SPOOL,
+    MOUSE_WRITE_BEHIND_FSYNC=1 — fsync на каждую запись), после commit в него пишется отметка ack;
+  - из очереди порции убираются только после commit, при ошибке БД пачка повторяется с паузой;
+  - при старте инстанса неподтверждённые порции из spool-файла снова ставятся в очередь.
+Падение между commit и записью ack даёт повтор уже записанных точек.
+
+Точки проверяются до постановки в очередь, но если пачка всё же падает на ошибке данных
+(is_data_error), порции пачки пишутся по одной: записываемые уходят в БД, а порция, которая
+не пишется и сама по себе, — в dead-letter файл MOUSE_WRITE_BEHIND_DEAD_LETTER вместе с ошибкой
+и убирается из очереди, чтобы не держать всё, что стоит за ней. Остальные ошибки (соединение,
+схема) считаются временными — пачка повторяется с паузой.
+Spool живёт на диске инстанса: он переживает падение процесса, но не потерю самого инстанса.
+
+Обратное давление: если в очереди больше MOUSE_WRITE_BEHIND_QUEUE_SIZE точек, enqueue ждёт
+до MOUSE_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS и затем бросает QueueFull (ответ 503 с Retry-After).
+Между вызовами функции платформа может заморозить инстанс вместе с фоновым потоком —
+очередь тогда дописывается при следующем вызове или при остановке процесса (atexit).
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+ENABLED = os.environ.get('MOUSE_WRITE_BEHIND', '0') == '1'
+QUEUE_SIZE = int(os.environ.get('MOUSE_WRITE_BEHIND_QUEUE_SIZE', '20000'))
+BATCH_SIZE = int(os.environ.get('MOUSE_WRITE_BEHIND_BATCH_SIZE', '1000'))
+FLUSH_MS = float(os.environ.get('MOUSE_WRITE_BEHIND_FLUSH_MS', '200'))
+ENQUEUE_TIMEOUT_MS = float(os.environ.get('MOUSE_WRITE_BEHIND_ENQUEUE_TIMEOUT_MS', '50'))
+SPOOL_PATH = os.environ.get(
+    'MOUSE_WRITE_BEHIND_SPOOL',
+    os.path.join(tempfile.gettempdir(), 'mouse-tracker-spool.ndjson')
+)
+SPOOL_FSYNC = os.environ.get('MOUSE_WRITE_BEHIND_FSYNC', '0') == '1'
+DEAD_LETTER_PATH = os.environ.get('MOUSE_WRITE_BEHIND_DEAD_LETTER', SPOOL_PATH + '.dead')
+MAX_RETRY_DELAY = 5.0
+
+
+class QueueFull(Exception):
+    pass
+
+
+class WriteBehindQueue:
+    """
+    write_batch(batches) получает список (session_id, points) и должен записать его
+    в одной транзакции; points — словари x, y, t (мс).
+    is_data_error(exception) — True, если повтор той же пачки не поможет
+    """
+
+    def __init__(self, write_batch, queue_size: int = QUEUE_SIZE, batch_size: int = BATCH_SIZE,
+                 flush_ms: float = FLUSH_MS, enqueue_timeout_ms: float = ENQUEUE_TIMEOUT_MS,
+                 spool_path: str = SPOOL_PATH, fsync: bool = SPOOL_FSYNC,
+                 is_data_error=None, dead_letter_path: str = DEAD_LETTER_PATH):
+        self.write_batch = write_batch
+        self.is_data_error = is_data_error or (lambda error: isinstance(error, (ValueError, TypeError)))
+        self.dead_letter_path = dead_letter_path
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.enqueue_timeout = enqueue_timeout_ms / 1000
+        self.spool_path = spool_path
+        self.fsync = fsync
+        self._entries = deque()
+        self._queued = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._spool = None
+        self._flusher = None
+        self._recover()
+        atexit.register(self._flush_at_exit)
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def enqueue(self, session_id: str, points: list) -> int:
+        """
+        Точки без клиентской метки получают время приёма, а не время записи в БД
+        """
+        if not points:
+            return 0
+        received_ms = time.time() * 1000
+        points = [
+            {'x': int(p.get('x', 0)), 'y': int(p.get('y', 0)), 't': p['t'] if p.get('t') is not None else received_ms}
+            for p in points
+        ]
+        deadline = time.monotonic() + self.enqueue_timeout
+        with self._cond:
+            while self._queued and self._queued + len(points) > self.queue_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueueFull(f'{self._queued} points waiting for flush')
+                self._cond.wait(remaining)
+            self._seq += 1
+            self._spool_write({'seq': self._seq, 's': session_id, 'p': points})
+            self._entries.append((self._seq, session_id, points))
+            self._queued += len(points)
+            self._ensure_flusher()
+            if self._queued >= self.batch_size:
+                self._cond.notify_all()
+        return len(points)
+
+    def flush(self) -> int:
+        """Синхронно дописывает всю очередь; возвращает число записанных точек"""
+        written = 0
+        while True:
+            count = self._flush_once()
+            if not count:
+                return written
+            written += count
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception as e:
+            print(f'Write-behind flush at exit failed, {self._queued} points stay in {self.spool_path}: {e}')
+
+    def _flush_once(self) -> int:
+        with self._flush_lock:
+            with self._cond:
+                batch, count = [], 0
+                for entry in self._entries:
+                    if batch and count + len(entry[2]) > self.batch_size:
+                        break
+                    batch.append(entry)
+                    count += len(entry[2])
+            if not batch:
+                return 0
+
+            try:
+                self.write_batch(self._group(batch))
+            except Exception as e:
+                if not self.is_data_error(e):
+                    raise
+                self._write_one_by_one(batch)
+
+            with self._cond:
+                # Убирает из очереди только записанное: пока шла запись, в конец могли добавиться новые порции
+                for _ in batch:
+                    self._entries.popleft()
+                self._queued -= count
+                if self._entries:
+                    self._spool_write({'ack': batch[-1][0]})
+                else:
+                    self._spool_truncate()
+                self._cond.notify_all()
+            return count
+
+    def _write_one_by_one(self, batch: list) -> None:
+        """
+        Пачка упала на ошибке данных: пишет порции по одной, непишущиеся — в dead-letter.
+        Временная ошибка на середине пробрасывается — пачка повторится целиком, записанные
+        порции при этом запишутся второй раз (та же гарантия «хотя бы один раз»)
+        """
+        for entry in batch:
+            seq, session_id, points = entry
+            try:
+                self.write_batch([(session_id, points)])
+            except Exception as e:
+                if not self.is_data_error(e):
+                    raise
+                self._dead_letter(entry, e)
+
+    def _dead_letter(self, entry: tuple, error: Exception) -> None:
+        seq, session_id, points = entry
+        print(f'Write-behind dropped {len(points)} points of session {session_id} '
+              f'to {self.dead_letter_path}: {error}')
+        try:
+            with open(self.dead_letter_path, 'ab') as dead:
+                dead.write(json.dumps({'seq': seq, 's': session_id, 'p': points, 'error': str(error)},
+                                      separators=(',', ':'), default=str).encode('utf-8') + b'\n')
+                dead.flush()
+                os.fsync(dead.fileno())
+        except OSError as e:
+            print(f'Write-behind dead-letter file is not writable, points are lost: {e}')
+
+    def _run(self) -> None:
+        failures = 0
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while self._queued < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self._flush_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(MAX_RETRY_DELAY, 0.1 * 2 ** failures)
+                print(f'Write-behind flush failed ({self._queued} points queued), retry in {delay:.1f}s: {e}')
+                time.sleep(delay)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._run, name='mouse-write-behind', daemon=True)
+            self._flusher.start()
+
+    @staticmethod
+    def _group(batch: list) -> list:
+        by_session = {}
+        for _, session_id, points in batch:
+            by_session.setdefault(session_id, []).extend(points)
+        return list(by_session.items())
+
+    def _recover(self) -> None:
+        """Ставит в очередь порции из spool-файла после последней отметки ack и переписывает его"""
+        pending, acked = [], 0
+        try:
+            with open(self.spool_path, 'rb') as spool:
+                for line in spool:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Недописанная строка от падения посреди записи
+                        continue
+                    if 'ack' in record:
+                        acked = max(acked, record['ack'])
+                    else:
+                        pending.append(record)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f'Write-behind spool is not readable, recovery skipped: {e}')
+
+        with self._cond:
+            for record in pending:
+                if record['seq'] > acked:
+                    self._seq += 1
+                    self._entries.append((self._seq, record['s'], record['p']))
+                    self._queued += len(record['p'])
+
+        try:
+            # Сжатый spool пишется рядом и подменяет старый атомарно: падение здесь ничего не теряет
+            compacted = f'{self.spool_path}.tmp'
+            with open(compacted, 'wb') as spool:
+                for seq, session_id, points in self._entries:
+                    spool.write(json.dumps({'seq': seq, 's': session_id, 'p': points},
+                                           separators=(',', ':')).encode('utf-8') + b'\n')
+                spool.flush()
+                os.fsync(spool.fileno())
+            os.replace(compacted, self.spool_path)
+            self._spool = open(self.spool_path, 'ab')
+        except OSError as e:
+            print(f'Write-behind spool is not writable, queued points are not durable: {e}')
+
+        if self._entries:
+            print(f'Write-behind recovered {self._queued} points from {self.spool_path}')
+            with self._cond:
+                self._ensure_flusher()
+
+    def _spool_write(self, record: dict) -> None:
+        if self._spool is None:
+            return
+        self._spool.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
+
+    def _spool_truncate(self) -> None:
+        if self._spool is None:
+            return
+        self._spool.truncate(0)
+        self._spool.flush()
+        if self.fsync:
+            os.fsync(self._spool.fileno())
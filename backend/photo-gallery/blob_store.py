@@ -0,0 +1,121 @@
+'''
+Контентно-адресуемое хранилище байтов фото: таблица photo_blobs с ключом SHA-256.
+Одинаковые загрузки ссылаются на одну строку, photos хранит только метаданные и content_hash.
+'''
+import base64
+import hashlib
+from typing import Iterator, List, Optional, Tuple
+
+import psycopg2
+
+import metrics
+
+# Кратно 3: base64 соседних кусков склеивается без паддинга внутри
+CHUNK_SIZE = 3 * 256 * 1024
+
+
+def content_hash_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def put_blob(cur, data: bytes) -> Tuple[str, bool]:
+    '''
+    Сохраняет байты, если такого содержимого ещё нет.
+    Возвращает (content_hash, True если строка создана, False если это дубликат)
+    '''
+    content_hash = content_hash_of(data)
+    cur.execute(
+        "INSERT INTO photo_blobs (content_hash, data, size) VALUES (%s, %s, %s) "
+        "ON CONFLICT (content_hash) DO NOTHING",
+        (content_hash, psycopg2.Binary(data), len(data))
+    )
+    return content_hash, cur.rowcount == 1
+
+
+def iter_blob_base64(cur, content_hash: str, size: int) -> Iterator[bytes]:
+    '''
+    Читает байты кусками через substring и отдаёт base64 по частям:
+    ни БД, ни Python не держат весь BYTEA целиком
+    '''
+    for offset in range(0, size, CHUNK_SIZE):
+        cur.execute(
+            "SELECT substring(data FROM %s FOR %s) FROM photo_blobs WHERE content_hash = %s",
+            (offset + 1, CHUNK_SIZE, content_hash)
+        )
+        row = cur.fetchone()
+        if not row:
+            raise LookupError(f'Blob {content_hash} was deleted while reading')
+        yield base64.b64encode(row[0])
+
+
+@metrics.timed('blob.read')
+def read_blob_base64(cur, content_hash: str) -> Optional[str]:
+    '''
+    base64 всего содержимого, собранный в заранее выделенный буфер, или None.
+    Ответ функции — строка, а decode копирует буфер, поэтому в конце чтения в памяти
+    две полные base64-копии (буфер и строка); буфер освобождается сразу после decode
+    '''
+    cur.execute("SELECT size FROM photo_blobs WHERE content_hash = %s", (content_hash,))
+    row = cur.fetchone()
+    if not row:
+        return None
+
+    size = row[0]
+    encoded = bytearray(4 * ((size + 2) // 3))
+    pos = 0
+    try:
+        for chunk in iter_blob_base64(cur, content_hash, size):
+            encoded[pos:pos + len(chunk)] = chunk
+            pos += len(chunk)
+    except LookupError:
+        return None
+    return encoded.decode('ascii')
+
+
+def read_blob(cur, content_hash: str) -> Optional[bytes]:
+    '''
+    Всё содержимое целиком — только там, где байты нужны разом (декодирование изображения)
+    '''
+    cur.execute("SELECT data FROM photo_blobs WHERE content_hash = %s", (content_hash,))
+    row = cur.fetchone()
+    return bytes(row[0]) if row else None
+
+
+def collect_garbage(cur, content_hashes: List[str]) -> int:
+    '''
+    Удаляет байты, на которые больше не ссылается ни одно фото; возвращает, сколько удалено.
+    Если параллельная загрузка успела сослаться на blob, внешний ключ не даст его удалить:
+    тогда проход повторяется по одному blob, и остаётся только тот, на который сослались
+    '''
+    if not content_hashes:
+        return 0
+    try:
+        return _delete_unreferenced(cur, list(content_hashes))
+    except psycopg2.IntegrityError:
+        pass
+    removed = 0
+    for content_hash in content_hashes:
+        try:
+            removed += _delete_unreferenced(cur, [content_hash])
+        except psycopg2.IntegrityError:
+            continue
+    return removed
+
+
+def _delete_unreferenced(cur, content_hashes: List[str]) -> int:
+    '''DELETE под savepoint: IntegrityError откатывает только его, транзакция продолжается'''
+    cur.execute("SAVEPOINT photo_blobs_gc")
+    try:
+        cur.execute(
+            "DELETE FROM photo_blobs b WHERE b.content_hash = ANY(%s) "
+            "AND NOT EXISTS (SELECT 1 FROM photos p WHERE p.content_hash = b.content_hash)",
+            (content_hashes,)
+        )
+        removed = cur.rowcount
+    except psycopg2.IntegrityError:
+        cur.execute("ROLLBACK TO SAVEPOINT photo_blobs_gc")
+        cur.execute("RELEASE SAVEPOINT photo_blobs_gc")
+        raise
+    # rowcount нужно взять до RELEASE: после него курсор сообщает -1
+    cur.execute("RELEASE SAVEPOINT photo_blobs_gc")
+    return removed
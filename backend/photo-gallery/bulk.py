@@ -0,0 +1,102 @@
+'''
+Массовые операции с фото: одно set-based выражение (= ANY(%s)) в одной транзакции
+вместо запроса на каждый id.
+  POST ?action=bulk-delete  {"ids": [...]} или {"uploaded_from": ISO, "uploaded_to": ISO}
+  POST ?action=bulk-meta    {"ids": [...]}
+Удаление по диапазону за один запрос снимает не больше MAX_IDS самых старых фото;
+has_more: true — повторить запрос с тем же диапазоном.
+'''
+from datetime import datetime
+from typing import Any, Dict, List
+
+import blob_store
+
+MAX_IDS = 10000
+INT4_MAX = 2 ** 31 - 1
+
+
+def parse_ids(body: Dict[str, Any]) -> List[int]:
+    ids = body.get('ids')
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty list')
+    if len(ids) > MAX_IDS:
+        raise ValueError(f'At most {MAX_IDS} ids per request')
+    parsed = []
+    for n, value in enumerate(ids):
+        try:
+            photo_id = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'ids[{n}] must be an integer') from None
+        if isinstance(value, (bool, float)) or not -INT4_MAX <= photo_id <= INT4_MAX:
+            raise ValueError(f'ids[{n}] must be an integer')
+        parsed.append(photo_id)
+    return parsed
+
+
+def parse_time(body: Dict[str, Any], key: str) -> datetime:
+    try:
+        return datetime.fromisoformat(body[key])
+    except (TypeError, ValueError):
+        raise ValueError(f'{key} must be an ISO 8601 date or datetime') from None
+
+
+def delete_photos(cur, body: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Удаляет фото по списку id или по диапазону uploaded_at [from, to),
+    затем одним запросом чистит байты, на которые больше никто не ссылается
+    '''
+    if 'ids' in body:
+        ids = parse_ids(body)
+        cur.execute("DELETE FROM photos WHERE id = ANY(%s) RETURNING id, content_hash", (ids,))
+        deleted = dict(cur.fetchall())
+        results = [{'id': i, 'status': 'deleted' if i in deleted else 'not_found'} for i in ids]
+    elif body.get('uploaded_from') and body.get('uploaded_to'):
+        uploaded_from = parse_time(body, 'uploaded_from')
+        uploaded_to = parse_time(body, 'uploaded_to')
+        cur.execute(
+            "DELETE FROM photos WHERE id IN ("
+            "SELECT id FROM photos WHERE uploaded_at >= %s AND uploaded_at < %s "
+            "ORDER BY uploaded_at, id LIMIT %s) RETURNING id, content_hash",
+            (uploaded_from, uploaded_to, MAX_IDS)
+        )
+        deleted = dict(cur.fetchall())
+        results = [{'id': i, 'status': 'deleted'} for i in sorted(deleted)]
+    else:
+        raise ValueError('Pass ids or uploaded_from and uploaded_to')
+
+    blobs_removed = blob_store.collect_garbage(cur, sorted(set(deleted.values())))
+    response = {
+        'success': True,
+        'deleted': len(deleted),
+        'blobs_removed': blobs_removed,
+        'results': results
+    }
+    if 'ids' not in body:
+        response['has_more'] = len(deleted) == MAX_IDS
+    return response
+
+
+def fetch_metadata(cur, body: Dict[str, Any]) -> Dict[str, Any]:
+    ids = parse_ids(body)
+    cur.execute(
+        "SELECT p.id, p.filename, p.content_type, p.uploaded_at, p.content_hash, b.size "
+        "FROM photos p JOIN photo_blobs b ON b.content_hash = p.content_hash "
+        "WHERE p.id = ANY(%s)",
+        (ids,)
+    )
+    found = {
+        row[0]: {
+            'id': row[0],
+            'filename': row[1],
+            'content_type': row[2],
+            'uploaded_at': row[3].isoformat(),
+            'content_hash': row[4],
+            'size': row[5]
+        }
+        for row in cur.fetchall()
+    }
+    results = [
+        {'id': i, 'status': 'found', 'photo': found[i]} if i in found else {'id': i, 'status': 'not_found'}
+        for i in ids
+    ]
+    return {'found': len(found), 'results': results}
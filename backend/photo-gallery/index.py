@@ -1,9 +1,139 @@
 import json
 import base64
 import os
-from typing import Dict, Any
-import psycopg2
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
 
+import blob_store
+import bulk
+import db_pool
+import metrics
+import uploads
+import variants
+
+PHOTO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 200
+LIST_FIELDS = ('id', 'filename', 'content_type', 'uploaded_at', 'content_hash')
+
+
+def parse_list_params(params: Dict[str, Any]) -> Tuple[int, Optional[Tuple[datetime, int]], List[str]]:
+    '''
+    limit, курсор after=<uploaded_at>,<id> и список полей fields=; ValueError при неверных значениях
+    '''
+    limit = int(params.get('limit') or LIST_DEFAULT_LIMIT)
+    if not 1 <= limit <= LIST_MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {LIST_MAX_LIMIT}')
+    
+    after = None
+    if params.get('after'):
+        uploaded_at, _, last_id = params['after'].rpartition(',')
+        after = (datetime.fromisoformat(uploaded_at), int(last_id))
+    
+    fields = list(LIST_FIELDS)
+    if params.get('fields'):
+        fields = [f.strip() for f in params['fields'].split(',') if f.strip()]
+        unknown = set(fields) - set(LIST_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(unknown))}')
+    return limit, after, fields
+
+
+def list_photos(cur, limit: int, after: Optional[Tuple[datetime, int]], fields: List[str]) -> Dict[str, Any]:
+    '''
+    Страница галереи по индексу (uploaded_at DESC, id DESC): стоимость O(limit) при любом размере таблицы
+    '''
+    columns = ['id', 'uploaded_at'] + [f for f in fields if f not in ('id', 'uploaded_at')]
+    where = "WHERE (uploaded_at, id) < (%s, %s)" if after else ""
+    cur.execute(
+        f"SELECT {', '.join(columns)} FROM photos {where} ORDER BY uploaded_at DESC, id DESC LIMIT %s",
+        (*(after or ()), limit + 1)
+    )
+    rows = cur.fetchall()
+    
+    photos = []
+    for row in rows[:limit]:
+        item = dict(zip(columns, row))
+        item['uploaded_at'] = item['uploaded_at'].isoformat()
+        photos.append({f: item[f] for f in fields})
+    
+    next_cursor = None
+    if len(rows) > limit:
+        last_id, last_uploaded_at = rows[limit - 1][0], rows[limit - 1][1]
+        next_cursor = f'{last_uploaded_at.isoformat()},{last_id}'
+    return {'photos': photos, 'next_cursor': next_cursor}
+
+
+def etag_for(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def etag_matches(event: Dict[str, Any], etag: str) -> bool:
+    '''
+    Проверка If-None-Match; сравнение слабое, префикс W/ не учитывается (RFC 9110, 13.1.2)
+    '''
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    header = headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(',')]
+    return '*' in candidates or any(c.removeprefix('W/') == etag for c in candidates)
+
+
+BULK_ACTIONS = {
+    'bulk-delete': bulk.delete_photos,
+    'bulk-meta': bulk.fetch_metadata
+}
+
+
+@metrics.timed('serialize')
+def serialize(body: Any) -> str:
+    return json.dumps(body, ensure_ascii=False)
+
+
+def json_response(status: int, body: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'isBase64Encoded': False,
+        'body': serialize(body)
+    }
+
+
+def is_upload_request(method: str, params: Dict[str, Any]) -> bool:
+    return method == 'PUT' or bool(params.get('upload_id')) or params.get('action') == 'upload-init'
+
+
+def handle_upload_request(cur, method: str, params: Dict[str, Any], event: Dict[str, Any]) -> Dict[str, Any]:
+    '''
+    Маршрутизация загрузки по частям (см. uploads.py); тело PUT — часть файла в base64
+    '''
+    action = params.get('action')
+    upload_id = params.get('upload_id', '')
+    
+    if method == 'POST' and action == 'upload-init':
+        body_data = json.loads(event.get('body') or '{}')
+        return json_response(201, uploads.init_upload(cur, body_data.get('filename'), body_data.get('content_type')))
+    
+    if method == 'PUT' and upload_id:
+        part_number = int(params.get('part', ''))
+        chunk = base64.b64decode(event.get('body') or '')
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        expected_sha256 = headers.get('x-chunk-sha256') or params.get('sha256')
+        return json_response(200, uploads.put_chunk(cur, upload_id, part_number, chunk, expected_sha256))
+    
+    if method == 'GET' and upload_id:
+        return json_response(200, uploads.upload_status(cur, upload_id))
+    
+    if method == 'POST' and action == 'upload-finalize' and upload_id:
+        body_data = json.loads(event.get('body') or '{}')
+        return json_response(201, uploads.finalize_upload(cur, upload_id, body_data.get('sha256')))
+    
+    raise uploads.UploadError(400, 'Unknown upload request')
+
+
+@metrics.instrument('photo-gallery')
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Бизнес: Загрузка фотографий и получение галереи
@@ -18,8 +148,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, If-None-Match, X-Chunk-Sha256',
                 'Access-Control-Max-Age': '86400'
             },
             'body': ''
@@ -34,22 +164,80 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'body': json.dumps({'error': 'DATABASE_URL not configured'})
         }
     
-    conn = psycopg2.connect(dsn)
-    cur = conn.cursor()
-    
-    try:
+    with db_pool.connection(dsn) as conn, conn.cursor() as cur:
+        query_params = event.get('queryStringParameters') or {}
+        if is_upload_request(method, query_params):
+            try:
+                response = handle_upload_request(cur, method, query_params, event)
+            except ValueError as e:
+                return json_response(getattr(e, 'status', 400), {'error': str(e)})
+            conn.commit()
+            return response
+        
+        bulk_action = BULK_ACTIONS.get(query_params.get('action', '')) if method == 'POST' else None
+        if bulk_action:
+            try:
+                result = bulk_action(cur, json.loads(event.get('body') or '{}'))
+            except ValueError as e:
+                return json_response(400, {'error': str(e)})
+            conn.commit()
+            return json_response(200, result)
+        
         if method == 'GET':
             params = event.get('queryStringParameters') or {}
             photo_id = params.get('id')
             
             if photo_id:
+                width = variants.snap_width(int(params['w'])) if params.get('w') else None
+                
                 cur.execute(
-                    "SELECT data, content_type FROM photos WHERE id = %s",
+                    "SELECT content_hash, content_type FROM photos WHERE id = %s",
                     (int(photo_id),)
                 )
                 row = cur.fetchone()
+                photo_base64 = None
+                
+                if row:
+                    content_hash, content_type = row
+                    etag = etag_for(f'{content_hash}-w{width}' if width else content_hash)
+                    
+                    if etag_matches(event, etag):
+                        return {
+                            'statusCode': 304,
+                            'headers': {
+                                'ETag': etag,
+                                'Cache-Control': PHOTO_CACHE_CONTROL,
+                                'Access-Control-Allow-Origin': '*'
+                            },
+                            'isBase64Encoded': False,
+                            'body': ''
+                        }
+                    
+                    if width:
+                        try:
+                            variant = variants.get_variant_base64(cur, content_hash, width)
+                        except ValueError:
+                            return {
+                                'statusCode': 415,
+                                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'Resized variants are available only for images'})
+                            }
+                        except LookupError:
+                            return {
+                                'statusCode': 404,
+                                'headers': {'Access-Control-Allow-Origin': '*'},
+                                'isBase64Encoded': False,
+                                'body': json.dumps({'error': 'Photo not found'})
+                            }
+                        conn.commit()
+                        if variant:
+                            photo_base64, content_type = variant
+                    
+                    if photo_base64 is None:
+                        photo_base64 = blob_store.read_blob_base64(cur, content_hash)
                 
-                if not row:
+                if photo_base64 is None:
                     return {
                         'statusCode': 404,
                         'headers': {'Access-Control-Allow-Origin': '*'},
@@ -57,28 +245,28 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'body': json.dumps({'error': 'Photo not found'})
                     }
                 
-                photo_data, content_type = row
                 return {
                     'statusCode': 200,
                     'headers': {
                         'Content-Type': content_type,
-                        'Access-Control-Allow-Origin': '*'
+                        'ETag': etag,
+                        'Cache-Control': PHOTO_CACHE_CONTROL,
+                        'Access-Control-Allow-Origin': '*',
+                        'Access-Control-Expose-Headers': 'ETag'
                     },
                     'isBase64Encoded': True,
-                    'body': base64.b64encode(photo_data).decode('utf-8')
+                    'body': photo_base64
                 }
             else:
-                cur.execute(
-                    "SELECT id, filename, content_type, uploaded_at FROM photos ORDER BY uploaded_at DESC"
-                )
-                photos = []
-                for row in cur.fetchall():
-                    photos.append({
-                        'id': row[0],
-                        'filename': row[1],
-                        'content_type': row[2],
-                        'uploaded_at': row[3].isoformat()
-                    })
+                try:
+                    limit, after, fields = parse_list_params(params)
+                except ValueError as e:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'isBase64Encoded': False,
+                        'body': json.dumps({'error': str(e)})
+                    }
                 
                 return {
                     'statusCode': 200,
@@ -87,7 +275,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'Access-Control-Allow-Origin': '*'
                     },
                     'isBase64Encoded': False,
-                    'body': json.dumps({'photos': photos}, ensure_ascii=False)
+                    'body': serialize(list_photos(cur, limit, after, fields))
                 }
         
         elif method == 'POST':
@@ -106,9 +294,12 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             photo_data = base64.b64decode(photo_base64)
             
+            content_hash, created = blob_store.put_blob(cur, photo_data)
+            del photo_data
+            
             cur.execute(
-                "INSERT INTO photos (filename, data, content_type) VALUES (%s, %s, %s) RETURNING id",
-                (filename, photo_data, content_type)
+                "INSERT INTO photos (filename, content_hash, content_type) VALUES (%s, %s, %s) RETURNING id",
+                (filename, content_hash, content_type)
             )
             photo_id = cur.fetchone()[0]
             conn.commit()
@@ -123,6 +314,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 'body': json.dumps({
                     'success': True,
                     'id': photo_id,
+                    'content_hash': content_hash,
+                    'deduplicated': not created,
                     'message': 'Photo uploaded successfully'
                 })
             }
@@ -139,7 +332,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'body': json.dumps({'error': 'Missing photo id'})
                 }
             
-            cur.execute("DELETE FROM photos WHERE id = %s", (int(photo_id),))
+            cur.execute("DELETE FROM photos WHERE id = %s RETURNING content_hash", (int(photo_id),))
+            blob_store.collect_garbage(cur, [row[0] for row in cur.fetchall()])
             conn.commit()
             
             return {
@@ -158,7 +352,4 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False,
             'body': json.dumps({'error': 'Method not allowed'})
         }
-    
-    finally:
-        cur.close()
-        conn.close()
+
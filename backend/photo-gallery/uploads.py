@@ -0,0 +1,139 @@
+'''
+Загрузка фото по частям с возможностью докачки:
+  POST ?action=upload-init                      -> upload_id
+  PUT  ?upload_id=..&part=N[&sha256=..]         -> часть N (0, 1, ...), повторная отправка заменяет часть
+  GET  ?upload_id=..                            -> какие части уже приняты
+  POST ?action=upload-finalize&upload_id=..     -> фото
+Части хранятся в photo_upload_chunks, при сборке байты склеиваются внутри Postgres,
+а SHA-256 считается по одной части за раз — в памяти функции не больше одной части.
+'''
+import hashlib
+import uuid
+from typing import Any, Dict, Optional
+
+import psycopg2
+
+
+MAX_CHUNK_SIZE = 3 * 1024 * 1024
+UPLOAD_TTL = '1 day'
+
+
+class UploadError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def cleanup_expired_uploads(cur) -> None:
+    cur.execute(f"DELETE FROM photo_uploads WHERE created_at < NOW() - INTERVAL '{UPLOAD_TTL}'")
+
+
+def init_upload(cur, filename: Optional[str], content_type: Optional[str]) -> Dict[str, Any]:
+    if not filename or not content_type:
+        raise UploadError(400, 'Missing required fields: filename, content_type')
+    cleanup_expired_uploads(cur)
+    upload_id = str(uuid.uuid4())
+    cur.execute(
+        "INSERT INTO photo_uploads (id, filename, content_type) VALUES (%s, %s, %s)",
+        (upload_id, filename, content_type)
+    )
+    return {'upload_id': upload_id, 'max_chunk_size': MAX_CHUNK_SIZE}
+
+
+def _require_upload(cur, upload_id: str) -> tuple:
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        raise UploadError(404, 'Upload not found')
+    cur.execute(
+        "SELECT filename, content_type FROM photo_uploads WHERE id = %s FOR UPDATE",
+        (upload_id,)
+    )
+    row = cur.fetchone()
+    if not row:
+        raise UploadError(404, 'Upload not found')
+    return row
+
+
+def put_chunk(cur, upload_id: str, part_number: int, data: bytes, expected_sha256: Optional[str]) -> Dict[str, Any]:
+    if part_number < 0:
+        raise UploadError(400, 'part must be >= 0')
+    if not data:
+        raise UploadError(400, 'Empty chunk')
+    if len(data) > MAX_CHUNK_SIZE:
+        raise UploadError(413, f'Chunk larger than {MAX_CHUNK_SIZE} bytes')
+
+    digest = hashlib.sha256(data).hexdigest()
+    if expected_sha256 and expected_sha256.lower() != digest:
+        raise UploadError(422, 'Chunk checksum mismatch')
+
+    _require_upload(cur, upload_id)
+    cur.execute(
+        "INSERT INTO photo_upload_chunks (upload_id, part_number, data, size, sha256) VALUES (%s, %s, %s, %s, %s) "
+        "ON CONFLICT (upload_id, part_number) DO UPDATE SET data = EXCLUDED.data, size = EXCLUDED.size, "
+        "sha256 = EXCLUDED.sha256",
+        (upload_id, part_number, psycopg2.Binary(data), len(data), digest)
+    )
+    return {'upload_id': upload_id, 'part': part_number, 'size': len(data), 'sha256': digest}
+
+
+def upload_status(cur, upload_id: str) -> Dict[str, Any]:
+    _require_upload(cur, upload_id)
+    cur.execute(
+        "SELECT part_number, size, sha256 FROM photo_upload_chunks WHERE upload_id = %s ORDER BY part_number",
+        (upload_id,)
+    )
+    parts = [{'part': row[0], 'size': row[1], 'sha256': row[2]} for row in cur.fetchall()]
+    return {'upload_id': upload_id, 'parts': parts, 'size': sum(p['size'] for p in parts)}
+
+
+def finalize_upload(cur, upload_id: str, expected_sha256: Optional[str]) -> Dict[str, Any]:
+    '''
+    Проверяет, что части идут подряд с нуля, считает SHA-256 всего файла по частям
+    и собирает photo_blobs одним INSERT ... SELECT string_agg на стороне БД
+    '''
+    filename, content_type = _require_upload(cur, upload_id)
+    cur.execute(
+        "SELECT part_number FROM photo_upload_chunks WHERE upload_id = %s ORDER BY part_number",
+        (upload_id,)
+    )
+    part_numbers = [row[0] for row in cur.fetchall()]
+    if not part_numbers:
+        raise UploadError(400, 'No chunks uploaded')
+    if part_numbers != list(range(len(part_numbers))):
+        missing = sorted(set(range(part_numbers[-1] + 1)) - set(part_numbers))
+        raise UploadError(400, f'Missing parts: {missing}')
+
+    digest = hashlib.sha256()
+    for part_number in part_numbers:
+        cur.execute(
+            "SELECT data FROM photo_upload_chunks WHERE upload_id = %s AND part_number = %s",
+            (upload_id, part_number)
+        )
+        digest.update(cur.fetchone()[0])
+    content_hash = digest.hexdigest()
+    if expected_sha256 and expected_sha256.lower() != content_hash:
+        raise UploadError(422, 'File checksum mismatch')
+
+    cur.execute(
+        "INSERT INTO photo_blobs (content_hash, data, size) "
+        "SELECT %s, string_agg(data, ''::bytea ORDER BY part_number), SUM(size) "
+        "FROM photo_upload_chunks WHERE upload_id = %s "
+        "ON CONFLICT (content_hash) DO NOTHING",
+        (content_hash, upload_id)
+    )
+    created = cur.rowcount == 1
+
+    cur.execute(
+        "INSERT INTO photos (filename, content_hash, content_type) VALUES (%s, %s, %s) RETURNING id",
+        (filename, content_hash, content_type)
+    )
+    photo_id = cur.fetchone()[0]
+    cur.execute("DELETE FROM photo_uploads WHERE id = %s", (upload_id,))
+    return {
+        'success': True,
+        'id': photo_id,
+        'content_hash': content_hash,
+        'deduplicated': not created,
+        'message': 'Photo uploaded successfully'
+    }
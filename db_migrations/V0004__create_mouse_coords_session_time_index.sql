@@ -0,0 +1,6 @@
+-- Covering index for per-session queries: window ordered by time, COUNT/MIN/MAX for stats
+CREATE INDEX IF NOT EXISTS idx_mouse_coords_session_created_at
+    ON mouse_coords(session_id, created_at DESC) INCLUDE (id, x, y);
+
+-- Single-column session index is a prefix of the composite one
+DROP INDEX IF EXISTS idx_mouse_coords_session;
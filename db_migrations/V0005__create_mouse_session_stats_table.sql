@@ -0,0 +1,15 @@
+-- Per-session totals maintained by the track path, getStats reads a single row
+CREATE TABLE IF NOT EXISTS mouse_session_stats (
+    session_id VARCHAR(255) PRIMARY KEY,
+    total_points BIGINT NOT NULL DEFAULT 0,
+    first_point TIMESTAMP,
+    last_point TIMESTAMP
+);
+
+-- Backfill from existing coordinates
+INSERT INTO mouse_session_stats (session_id, total_points, first_point, last_point)
+SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at)
+FROM mouse_coords
+WHERE session_id IS NOT NULL
+GROUP BY session_id
+ON CONFLICT (session_id) DO NOTHING;
@@ -0,0 +1,120 @@
+-- Convert mouse_coords into daily range partitions by created_at.
+-- Expired days are removed by dropping (or detaching) whole partitions, see mouse_coords_maintain().
+ALTER TABLE mouse_coords RENAME TO mouse_coords_legacy;
+ALTER INDEX mouse_coords_pkey RENAME TO mouse_coords_legacy_pkey;
+ALTER INDEX IF EXISTS idx_mouse_coords_created_at RENAME TO idx_mouse_coords_legacy_created_at;
+ALTER INDEX IF EXISTS idx_mouse_coords_session_created_at RENAME TO idx_mouse_coords_legacy_session_created_at;
+
+CREATE TABLE mouse_coords (
+    id INTEGER NOT NULL DEFAULT nextval('mouse_coords_id_seq'),
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    session_id VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE mouse_coords_id_seq OWNED BY mouse_coords.id;
+
+CREATE INDEX IF NOT EXISTS idx_mouse_coords_created_at ON mouse_coords(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_mouse_coords_session_created_at
+    ON mouse_coords(session_id, created_at DESC) INCLUDE (id, x, y);
+
+-- Catches rows outside pre-created days so inserts never fail
+CREATE TABLE IF NOT EXISTS mouse_coords_default PARTITION OF mouse_coords DEFAULT;
+
+-- Creates the partition for one day, moving matching rows out of the default partition first
+CREATE OR REPLACE FUNCTION mouse_coords_ensure_partition(partition_day DATE) RETURNS TEXT AS $$
+DECLARE
+    partition_name TEXT := 'mouse_coords_' || to_char(partition_day, 'YYYYMMDD');
+BEGIN
+    IF to_regclass(partition_name) IS NOT NULL THEN
+        RETURN NULL;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE mouse_coords INCLUDING DEFAULTS)', partition_name);
+    EXECUTE format(
+        'ALTER TABLE %I ADD CONSTRAINT %I CHECK (created_at >= %L AND created_at < %L)',
+        partition_name, partition_name || '_range', partition_day, partition_day + 1
+    );
+    EXECUTE format(
+        'WITH moved AS (DELETE FROM mouse_coords_default WHERE created_at >= %L AND created_at < %L RETURNING *) '
+        'INSERT INTO %I SELECT * FROM moved',
+        partition_day, partition_day + 1, partition_name
+    );
+    EXECUTE format(
+        'ALTER TABLE mouse_coords ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, partition_day, partition_day + 1
+    );
+    EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', partition_name, partition_name || '_range');
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Pre-creates partitions for the next days_ahead days and drops (or detaches and renames
+-- to mouse_coords_archive_YYYYMMDD) partitions older than retention_days
+CREATE OR REPLACE FUNCTION mouse_coords_maintain(days_ahead INTEGER, retention_days INTEGER, archive BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+DECLARE
+    target_day DATE;
+    created TEXT;
+    expired RECORD;
+    cutoff DATE := CURRENT_DATE - retention_days;
+BEGIN
+    FOR target_day IN SELECT generate_series(CURRENT_DATE, CURRENT_DATE + days_ahead, INTERVAL '1 day')::date LOOP
+        created := mouse_coords_ensure_partition(target_day);
+        IF created IS NOT NULL THEN
+            action := 'created';
+            partition_name := created;
+            RETURN NEXT;
+        END IF;
+    END LOOP;
+
+    FOR expired IN
+        SELECT c.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'mouse_coords'::regclass
+          AND c.relname ~ '^mouse_coords_[0-9]{8}$'
+          AND to_date(substring(c.relname FROM '[0-9]{8}$'), 'YYYYMMDD') < cutoff
+        ORDER BY c.relname
+    LOOP
+        IF archive THEN
+            EXECUTE format('ALTER TABLE mouse_coords DETACH PARTITION %I', expired.name);
+            EXECUTE format('ALTER TABLE %I RENAME TO %I', expired.name,
+                           replace(expired.name, 'mouse_coords_', 'mouse_coords_archive_'));
+            action := 'archived';
+        ELSE
+            EXECUTE format('DROP TABLE %I', expired.name);
+            action := 'dropped';
+        END IF;
+        partition_name := expired.name;
+        RETURN NEXT;
+    END LOOP;
+
+    -- Stragglers in the default partition are rare, a plain DELETE is enough for them
+    DELETE FROM mouse_coords_default WHERE created_at < cutoff;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Partitions for every day that has data, plus a week ahead, then copy the rows over
+DO $$
+DECLARE
+    target_day DATE;
+BEGIN
+    FOR target_day IN
+        SELECT generate_series(
+            COALESCE((SELECT MIN(created_at)::date FROM mouse_coords_legacy), CURRENT_DATE),
+            CURRENT_DATE + 7,
+            INTERVAL '1 day'
+        )::date
+    LOOP
+        PERFORM mouse_coords_ensure_partition(target_day);
+    END LOOP;
+END $$;
+
+INSERT INTO mouse_coords (id, x, y, session_id, created_at)
+SELECT id, x, y, session_id, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM mouse_coords_legacy;
+
+DROP TABLE mouse_coords_legacy;
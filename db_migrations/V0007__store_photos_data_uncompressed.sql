@@ -0,0 +1,3 @@
+-- Images are already compressed; EXTERNAL storage skips TOAST compression
+-- so substring() reads only the chunks it needs instead of detoasting the whole value
+ALTER TABLE photos ALTER COLUMN data SET STORAGE EXTERNAL;
@@ -0,0 +1,27 @@
+-- Content-addressed photo bytes: identical uploads share one row keyed by SHA-256
+CREATE TABLE IF NOT EXISTS photo_blobs (
+    content_hash CHAR(64) PRIMARY KEY,
+    data BYTEA NOT NULL,
+    size BIGINT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE photo_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
+-- Move existing bytes out of photos
+ALTER TABLE photos ADD COLUMN IF NOT EXISTS content_hash CHAR(64);
+
+UPDATE photos SET content_hash = encode(sha256(data), 'hex') WHERE content_hash IS NULL;
+
+INSERT INTO photo_blobs (content_hash, data, size)
+SELECT DISTINCT ON (content_hash) content_hash, data, octet_length(data)
+FROM photos
+ORDER BY content_hash, id
+ON CONFLICT (content_hash) DO NOTHING;
+
+ALTER TABLE photos ALTER COLUMN content_hash SET NOT NULL;
+ALTER TABLE photos ADD CONSTRAINT fk_photos_content_hash
+    FOREIGN KEY (content_hash) REFERENCES photo_blobs(content_hash);
+ALTER TABLE photos DROP COLUMN data;
+
+CREATE INDEX IF NOT EXISTS idx_photos_content_hash ON photos(content_hash);
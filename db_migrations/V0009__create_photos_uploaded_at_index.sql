@@ -0,0 +1,5 @@
+-- Keyset pagination for the gallery listing: ORDER BY uploaded_at DESC, id DESC
+UPDATE photos SET uploaded_at = CURRENT_TIMESTAMP WHERE uploaded_at IS NULL;
+ALTER TABLE photos ALTER COLUMN uploaded_at SET NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_photos_uploaded_at_id ON photos(uploaded_at DESC, id DESC);
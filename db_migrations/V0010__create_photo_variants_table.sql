@@ -0,0 +1,10 @@
+-- Resized copies of photo bytes, generated on first request to ?id=..&w=..
+CREATE TABLE IF NOT EXISTS photo_variants (
+    content_hash CHAR(64) NOT NULL REFERENCES photo_blobs(content_hash) ON DELETE CASCADE,
+    width INTEGER NOT NULL,
+    content_type VARCHAR(100) NOT NULL,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, width)
+);
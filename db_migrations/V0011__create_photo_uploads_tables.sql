@@ -0,0 +1,20 @@
+-- Chunked, resumable photo uploads: parts are stored until finalize assembles them into photo_blobs
+CREATE TABLE IF NOT EXISTS photo_uploads (
+    id UUID PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    content_type VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_photo_uploads_created_at ON photo_uploads(created_at);
+
+CREATE TABLE IF NOT EXISTS photo_upload_chunks (
+    upload_id UUID NOT NULL REFERENCES photo_uploads(id) ON DELETE CASCADE,
+    part_number INTEGER NOT NULL,
+    data BYTEA NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    PRIMARY KEY (upload_id, part_number)
+);
+
+ALTER TABLE photo_upload_chunks ALTER COLUMN data SET STORAGE EXTERNAL;
@@ -0,0 +1,47 @@
+-- Staging for MOUSE_INGEST_TARGET=staging: unlogged and index-free, so an insert costs
+-- one heap write with no WAL and no B-tree maintenance.
+-- Rows reach mouse_coords through mouse_coords_merge_staging(), run by staging.py on a schedule.
+-- Crash recovery: PostgreSQL truncates unlogged tables after an unclean shutdown, so points
+-- not merged yet (at most one merge interval) are lost; a clean restart keeps them.
+-- Merging is one transaction, so a row is either still in staging or already in mouse_coords.
+CREATE UNLOGGED TABLE IF NOT EXISTS mouse_coords_staging (
+    session_id VARCHAR(255),
+    x INTEGER NOT NULL,
+    y INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+) WITH (autovacuum_vacuum_scale_factor = 0, autovacuum_vacuum_threshold = 10000);
+
+-- Moves up to batch_limit staged rows into mouse_coords sorted by (session_id, created_at)
+-- so index inserts land on neighbouring pages, and folds them into mouse_session_stats.
+-- SKIP LOCKED lets several merge jobs run side by side.
+CREATE OR REPLACE FUNCTION mouse_coords_merge_staging(batch_limit INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    merged INTEGER;
+BEGIN
+    WITH picked AS (
+        SELECT ctid FROM mouse_coords_staging LIMIT batch_limit FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM mouse_coords_staging
+        WHERE ctid = ANY(ARRAY(SELECT ctid FROM picked))
+        RETURNING session_id, x, y, created_at
+    ), inserted AS (
+        INSERT INTO mouse_coords (session_id, x, y, created_at)
+        SELECT session_id, x, y, created_at FROM moved ORDER BY session_id, created_at
+        RETURNING session_id, created_at
+    ), stats AS (
+        INSERT INTO mouse_session_stats (session_id, total_points, first_point, last_point)
+        SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at)
+        FROM inserted
+        WHERE session_id IS NOT NULL
+        GROUP BY session_id
+        ON CONFLICT (session_id) DO UPDATE SET
+            total_points = mouse_session_stats.total_points + EXCLUDED.total_points,
+            first_point = LEAST(mouse_session_stats.first_point, EXCLUDED.first_point),
+            last_point = GREATEST(mouse_session_stats.last_point, EXCLUDED.last_point)
+    )
+    SELECT COUNT(*) INTO merged FROM inserted;
+
+    RETURN merged;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,29 @@
+-- Broadcast jobs of telegram-bot (action=broadcast): one row per job, one row per recipient with its result
+CREATE TABLE IF NOT EXISTS telegram_broadcasts (
+    id UUID PRIMARY KEY,
+    text TEXT NOT NULL,
+    photo_url TEXT,
+    parse_mode VARCHAR(20),
+    silent BOOLEAN NOT NULL DEFAULT FALSE,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    total INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS telegram_broadcast_recipients (
+    id BIGSERIAL PRIMARY KEY,
+    broadcast_id UUID NOT NULL REFERENCES telegram_broadcasts(id) ON DELETE CASCADE,
+    chat_id VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    message_id BIGINT,
+    error_code INTEGER,
+    error TEXT,
+    claimed_at TIMESTAMP,
+    sent_at TIMESTAMP,
+    UNIQUE (broadcast_id, chat_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_telegram_broadcast_recipients_pending
+    ON telegram_broadcast_recipients(broadcast_id, id) WHERE status IN ('pending', 'sending');
@@ -0,0 +1,65 @@
+-- mouse_session_stats describes the points currently in mouse_coords, the same thing
+-- session_stats.repair() computes. Dropping or detaching expired partitions used to leave
+-- their points in the totals, so getStats changed once repair ran.
+-- mouse_coords_maintain() now recounts sessions that had points before the cutoff,
+-- and deletes the ones with no points left.
+CREATE OR REPLACE FUNCTION mouse_coords_maintain(days_ahead INTEGER, retention_days INTEGER, archive BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (action TEXT, partition_name TEXT) AS $$
+DECLARE
+    target_day DATE;
+    created TEXT;
+    expired RECORD;
+    cutoff DATE := CURRENT_DATE - retention_days;
+BEGIN
+    FOR target_day IN SELECT generate_series(CURRENT_DATE, CURRENT_DATE + days_ahead, INTERVAL '1 day')::date LOOP
+        created := mouse_coords_ensure_partition(target_day);
+        IF created IS NOT NULL THEN
+            action := 'created';
+            partition_name := created;
+            RETURN NEXT;
+        END IF;
+    END LOOP;
+
+    FOR expired IN
+        SELECT c.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'mouse_coords'::regclass
+          AND c.relname ~ '^mouse_coords_[0-9]{8}$'
+          AND to_date(substring(c.relname FROM '[0-9]{8}$'), 'YYYYMMDD') < cutoff
+        ORDER BY c.relname
+    LOOP
+        IF archive THEN
+            EXECUTE format('ALTER TABLE mouse_coords DETACH PARTITION %I', expired.name);
+            EXECUTE format('ALTER TABLE %I RENAME TO %I', expired.name,
+                           replace(expired.name, 'mouse_coords_', 'mouse_coords_archive_'));
+            action := 'archived';
+        ELSE
+            EXECUTE format('DROP TABLE %I', expired.name);
+            action := 'dropped';
+        END IF;
+        partition_name := expired.name;
+        RETURN NEXT;
+    END LOOP;
+
+    -- Stragglers in the default partition are rare, a plain DELETE is enough for them
+    DELETE FROM mouse_coords_default WHERE created_at < cutoff;
+
+    -- Only sessions whose first point is older than the cutoff lost points. The lock is the same
+    -- one repair() takes, so a concurrent track cannot add to a row between the count and the update.
+    LOCK TABLE mouse_session_stats IN SHARE ROW EXCLUSIVE MODE;
+    UPDATE mouse_session_stats s
+    SET total_points = c.total_points, first_point = c.first_point, last_point = c.last_point
+    FROM (
+        SELECT session_id, COUNT(*) AS total_points, MIN(created_at) AS first_point, MAX(created_at) AS last_point
+        FROM mouse_coords
+        WHERE session_id IN (SELECT session_id FROM mouse_session_stats WHERE first_point < cutoff)
+        GROUP BY session_id
+    ) c
+    WHERE s.session_id = c.session_id;
+
+    DELETE FROM mouse_session_stats s
+    WHERE s.first_point < cutoff
+      AND NOT EXISTS (SELECT 1 FROM mouse_coords c WHERE c.session_id = s.session_id);
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,312 @@
+"""
+Benchmark harness: replays every function's tests.json against its handler.
+
+For each backend/**/index.py that has a tests.json next to it, a separate worker
+process imports the handler, since functions ship modules with the same names
+(db_pool, metrics, ...). The worker replays the cases in order from --concurrency
+threads for --iterations rounds and reports, per case:
+  - p50/p95/p99/mean/max latency;
+  - status mismatches against expectedStatus, and exceptions counted by type;
+  - memory per call from a separate tracemalloc pass: peak and retained bytes.
+Throughput and import (cold start) time are reported per function.
+
+Functions that read DATABASE_URL are skipped unless it is set. Point it at a
+disposable local Postgres with db_migrations applied, because the cases write data.
+
+Results are written as JSON. Pass --baseline to compare two runs: a case regresses
+when p95 or peak memory grows, or throughput drops, by more than --threshold
+percent. The exit code is then 1.
+
+Usage:
+    python scripts/bench_functions.py [--functions mouse-tracker,photo-gallery] [--concurrency 4]
+        [--iterations 50] [--output bench.json] [--baseline previous.json] [--threshold 10]
+"""
+
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / "backend"
+MIN_LATENCY_DELTA_MS = 0.05
+
+
+def discover(names: set = None) -> list:
+    functions = []
+    for index in sorted(BACKEND.rglob("index.py")):
+        function_dir = index.parent
+        if not (function_dir / "tests.json").exists():
+            continue
+        if names and function_dir.name not in names:
+            continue
+        functions.append(function_dir)
+    return functions
+
+
+def needs_database(function_dir: Path) -> bool:
+    return "DATABASE_URL" in (function_dir / "index.py").read_text(encoding="utf-8")
+
+
+def build_event(case: dict) -> dict:
+    url = urlsplit(case.get("path", "/"))
+    event = {
+        "httpMethod": case.get("method", "GET"),
+        "path": url.path or "/",
+        "headers": {"Content-Type": "application/json"},
+        "queryStringParameters": dict(parse_qsl(url.query)),
+        "requestContext": {"eventType": "MESSAGE", "connectionId": "bench"},
+        "isBase64Encoded": False,
+    }
+    if "body" in case:
+        body = case["body"]
+        event["body"] = body if isinstance(body, str) else json.dumps(body)
+    return event
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(len(sorted_values) * q / 100) - 1))
+    return sorted_values[index]
+
+
+# ----------------------------------------------------------------------------- worker
+
+def load_handler(function_dir: Path):
+    sys.path.insert(0, str(function_dir))
+    spec = importlib.util.spec_from_file_location(f"{function_dir.name}_index", function_dir / "index.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def make_context(function_dir: Path) -> SimpleNamespace:
+    """Same shape as scripts/local_runtime.py passes"""
+    return SimpleNamespace(request_id=uuid.uuid4().hex, function_name=function_dir.name,
+                           function_version="bench", memory_limit_in_mb=None)
+
+
+def invoke(handler, event: dict, context) -> tuple:
+    """(latency ns, statusCode, or the exception type name if the handler raised)"""
+    started = time.perf_counter_ns()
+    try:
+        status = handler(dict(event), context).get("statusCode")
+    except Exception as e:
+        status = type(e).__name__
+    return time.perf_counter_ns() - started, status
+
+
+def run_worker(function_dir: Path, concurrency: int, iterations: int, alloc_samples: int) -> dict:
+    cases = json.loads((function_dir / "tests.json").read_text(encoding="utf-8"))["tests"]
+    events = [build_event(case) for case in cases]
+    expected = [case.get("expectedStatus") for case in cases]
+    context = make_context(function_dir)
+
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        started = time.perf_counter_ns()
+        handler = load_handler(function_dir)
+        import_ms = (time.perf_counter_ns() - started) / 1e6
+
+        # Warm-up: the first call of each case (pool connections, caches) is not measured
+        for event in events:
+            invoke(handler, event, context)
+
+        latencies = [[] for _ in cases]
+        errors = [Counter() for _ in cases]
+        mismatches = [0] * len(cases)
+        lock = threading.Lock()
+
+        def worker():
+            local = [[] for _ in cases]
+            local_errors = [Counter() for _ in cases]
+            local_mismatches = [0] * len(cases)
+            for _ in range(iterations):
+                for i, event in enumerate(events):
+                    elapsed, status = invoke(handler, event, context)
+                    local[i].append(elapsed)
+                    if isinstance(status, str):
+                        local_errors[i][status] += 1
+                    elif expected[i] is not None and status != expected[i]:
+                        local_mismatches[i] += 1
+            with lock:
+                for i in range(len(cases)):
+                    latencies[i].extend(local[i])
+                    errors[i] += local_errors[i]
+                    mismatches[i] += local_mismatches[i]
+
+        wall_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for future in [pool.submit(worker) for _ in range(concurrency)]:
+                future.result()
+        wall = time.perf_counter() - wall_started
+
+        memory = []
+        tracemalloc.start()
+        for event in events:
+            peaks, retained = [], []
+            for _ in range(alloc_samples):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                invoke(handler, event, context)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+            memory.append((sum(peaks) / len(peaks), sum(retained) / len(retained)))
+        tracemalloc.stop()
+
+    result_cases = {}
+    for i, case in enumerate(cases):
+        values = sorted(v / 1e6 for v in latencies[i])
+        result_cases[case.get("name", f"case {i}")] = {
+            "calls": len(values),
+            "errors": sum(errors[i].values()),
+            "error_types": dict(errors[i]),
+            "status_mismatches": mismatches[i],
+            "mean_ms": round(sum(values) / len(values), 4) if values else 0.0,
+            "p50_ms": round(percentile(values, 50), 4),
+            "p95_ms": round(percentile(values, 95), 4),
+            "p99_ms": round(percentile(values, 99), 4),
+            "max_ms": round(values[-1], 4) if values else 0.0,
+            "peak_alloc_bytes": round(memory[i][0]),
+            "retained_bytes": round(memory[i][1]),
+        }
+    total_calls = sum(c["calls"] for c in result_cases.values())
+    return {
+        "import_ms": round(import_ms, 2),
+        "calls": total_calls,
+        "throughput_per_sec": round(total_calls / wall, 1) if wall else 0.0,
+        "cases": result_cases,
+    }
+
+
+# ----------------------------------------------------------------------------- runner
+
+def run_function(function_dir: Path, args) -> dict:
+    if needs_database(function_dir) and not os.environ.get("DATABASE_URL"):
+        return {"skipped": "DATABASE_URL is not set"}
+    env = {**os.environ, "METRICS_LOG": "0"}
+    completed = subprocess.run(
+        [sys.executable, __file__, "--worker", str(function_dir),
+         "--concurrency", str(args.concurrency), "--iterations", str(args.iterations),
+         "--alloc-samples", str(args.alloc_samples)],
+        capture_output=True, text=True, env=env, cwd=function_dir
+    )
+    if completed.returncode != 0:
+        return {"failed": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "worker failed"}
+    return json.loads(completed.stdout)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=ROOT, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Список строк-описаний регрессий"""
+    regressions = []
+    factor = threshold / 100
+    for name, result in current["functions"].items():
+        old = baseline.get("functions", {}).get(name)
+        if not old or "cases" not in old or "cases" not in result:
+            continue
+        if result["throughput_per_sec"] < old["throughput_per_sec"] * (1 - factor):
+            regressions.append(f"{name}: throughput {old['throughput_per_sec']} -> {result['throughput_per_sec']}/s")
+        for case_name, case in result["cases"].items():
+            old_case = old["cases"].get(case_name)
+            if not old_case:
+                continue
+            if (case["p95_ms"] > old_case["p95_ms"] * (1 + factor)
+                    and case["p95_ms"] - old_case["p95_ms"] > MIN_LATENCY_DELTA_MS):
+                regressions.append(f"{name} / {case_name}: p95 {old_case['p95_ms']} -> {case['p95_ms']} ms")
+            if case["peak_alloc_bytes"] > old_case["peak_alloc_bytes"] * (1 + factor):
+                regressions.append(
+                    f"{name} / {case_name}: peak alloc {old_case['peak_alloc_bytes']} -> {case['peak_alloc_bytes']} B"
+                )
+    return regressions
+
+
+def print_report(results: dict) -> None:
+    print(f"{'function / case':<52}{'calls/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'peak KiB':>10}{'errors':>8}")
+    for name, result in results["functions"].items():
+        if "cases" not in result:
+            print(f"{name:<52}  {result.get('skipped') or result.get('failed')}")
+            continue
+        print(f"{name:<52}{result['throughput_per_sec']:>10.0f}   (import {result['import_ms']} ms)")
+        for case_name, case in result["cases"].items():
+            print(f"{'  ' + case_name[:48]:<52}{'':>10}{case['p50_ms']:>10.3f}{case['p95_ms']:>10.3f}"
+                  f"{case['p99_ms']:>10.3f}{case['peak_alloc_bytes'] / 1024:>10.1f}"
+                  f"{case['errors'] + case['status_mismatches']:>8}")
+            if case.get("error_types"):
+                print("      raised: " + ", ".join(f"{name} x{count}" for name, count in case["error_types"].items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", help="comma-separated function directory names (default: all)")
+    parser.add_argument("--concurrency", type=int, default=4, help="threads replaying the cases")
+    parser.add_argument("--iterations", type=int, default=50, help="rounds over all cases per thread")
+    parser.add_argument("--alloc-samples", type=int, default=5, help="calls per case under tracemalloc")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_worker(Path(args.worker), args.concurrency, args.iterations, args.alloc_samples)
+        print(json.dumps(result))
+        return 0
+
+    names = set(args.functions.split(",")) if args.functions else None
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "concurrency": args.concurrency,
+            "iterations": args.iterations,
+        },
+        "functions": {},
+    }
+    for function_dir in discover(names):
+        name = str(function_dir.relative_to(BACKEND))
+        results["functions"][name] = run_function(function_dir, args)
+
+    print_report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        regressions = compare(json.loads(Path(args.baseline).read_text()), results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold}%:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
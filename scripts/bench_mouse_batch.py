@@ -0,0 +1,90 @@
+"""
+Benchmark: mouse-tracker ingestion throughput, `track` vs `trackBatch`.
+
+Calls the real handler from backend/mouse-tracker against the database in
+DATABASE_URL and reports points/sec for batch sizes 1..1000.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/bench_mouse_batch.py [--points 5000] [--json out.json]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BATCH_SIZES = [1, 10, 50, 100, 250, 500, 1000]
+
+
+def load_handler(function_dir: Path):
+    sys.path.insert(0, str(function_dir))
+    spec = importlib.util.spec_from_file_location(f"{function_dir.name}_index", function_dir / "index.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def call(handler, payload: dict) -> dict:
+    response = handler({"httpMethod": "POST", "body": json.dumps(payload)}, None)
+    if response["statusCode"] != 200:
+        raise RuntimeError(f"handler returned {response['statusCode']}: {response['body']}")
+    return response
+
+
+def bench_single(handler, total_points: int) -> float:
+    session_id = f"bench-single-{uuid.uuid4().hex[:8]}"
+    started = time.perf_counter()
+    for i in range(total_points):
+        call(handler, {"action": "track", "x": i % 1920, "y": i % 1080, "sessionId": session_id})
+    return total_points / (time.perf_counter() - started)
+
+
+def bench_batch(handler, total_points: int, batch_size: int) -> float:
+    session_id = f"bench-batch{batch_size}-{uuid.uuid4().hex[:8]}"
+    base_ms = int(time.time() * 1000)
+    sent = 0
+    started = time.perf_counter()
+    while sent < total_points:
+        size = min(batch_size, total_points - sent)
+        points = [
+            {"x": (sent + i) % 1920, "y": (sent + i) % 1080, "t": base_ms + sent + i}
+            for i in range(size)
+        ]
+        call(handler, {"action": "trackBatch", "sessionId": session_id, "points": points})
+        sent += size
+    return total_points / (time.perf_counter() - started)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=5000, help="points written per scenario")
+    parser.add_argument("--single-points", type=int, default=500, help="points written by the `track` baseline")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    handler = load_handler(ROOT / "backend" / "mouse-tracker")
+
+    results = {"track": bench_single(handler, args.single_points), "trackBatch": {}}
+    print(f"{'mode':<18}{'points/sec':>14}")
+    print(f"{'track':<18}{results['track']:>14.0f}")
+    for size in BATCH_SIZES:
+        rate = bench_batch(handler, args.points, size)
+        results["trackBatch"][size] = rate
+        print(f"{f'trackBatch x{size}':<18}{rate:>14.0f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
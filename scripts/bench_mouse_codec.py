@@ -0,0 +1,118 @@
+"""
+Benchmark: mouse-tracker wire formats, JSON vs the binary codec (application/x-mouse-points).
+
+Needs no database: builds synthetic mouse trajectories and measures encode/decode
+time and payload size (raw and base64, as it travels through the gateway) for
+inbound batches ({x, y, t}) and outbound windows ({id, x, y, timestamp}).
+
+Usage:
+    python scripts/bench_mouse_codec.py [--sizes 10,100,1000] [--repeat 200] [--json out.json]
+"""
+
+import argparse
+import base64
+import json
+import math
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "backend" / "mouse-tracker"))
+
+import codec  # noqa: E402
+
+
+def trajectory(size: int, seed: int = 1) -> list:
+    """Smooth movement with jitter, ~60 Hz sampling"""
+    rng = random.Random(seed)
+    base_ms = int(time.time() * 1000)
+    x, y, angle = 960.0, 540.0, 0.0
+    points = []
+    for i in range(size):
+        angle += rng.uniform(-0.3, 0.3)
+        x = min(max(x + math.cos(angle) * rng.uniform(0, 12), 0), 1919)
+        y = min(max(y + math.sin(angle) * rng.uniform(0, 12), 0), 1079)
+        points.append({"x": int(x), "y": int(y), "t": base_ms + i * 16 + rng.randint(0, 2)})
+    return points
+
+
+def as_window(points: list) -> list:
+    return [{
+        "id": 1_000_000 + i,
+        "x": p["x"],
+        "y": p["y"],
+        "timestamp": datetime.fromtimestamp(p["t"] / 1000, tz=timezone.utc).replace(tzinfo=None).isoformat()
+    } for i, p in enumerate(points)]
+
+
+def timed(fn, repeat: int) -> float:
+    """Best-of-repeat time per call, microseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1e6
+
+
+def bench(size: int, repeat: int) -> dict:
+    points = trajectory(size)
+    request_json = {"action": "trackBatch", "sessionId": "bench-session", "points": points}
+    window = as_window(points)
+    response_json = {"action": "tracked", "coordinates": window, "total": len(window)}
+
+    json_request = json.dumps(request_json)
+    binary_request = codec.encode_points(points, "bench-session")
+    json_response = json.dumps(response_json)
+    binary_response = codec.encode_coordinates(window)
+
+    return {
+        "request": {
+            "json_bytes": len(json_request),
+            "binary_bytes": len(binary_request),
+            "binary_base64_bytes": len(base64.b64encode(binary_request)),
+            "json_encode_us": timed(lambda: json.dumps(request_json), repeat),
+            "json_decode_us": timed(lambda: json.loads(json_request), repeat),
+            "binary_encode_us": timed(lambda: codec.encode_points(points, "bench-session"), repeat),
+            "binary_decode_us": timed(lambda: codec.decode_points(binary_request), repeat),
+        },
+        "response": {
+            "json_bytes": len(json_response),
+            "binary_bytes": len(binary_response),
+            "binary_base64_bytes": len(base64.b64encode(binary_response)),
+            "json_encode_us": timed(lambda: json.dumps(response_json), repeat),
+            "binary_encode_us": timed(lambda: codec.encode_coordinates(window), repeat),
+        },
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000", help="comma-separated points per payload")
+    parser.add_argument("--repeat", type=int, default=200, help="timing repetitions (best is reported)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'payload':<16}{'json B':>10}{'bin B':>10}{'b64 B':>10}{'json enc us':>14}{'bin enc us':>13}"
+          f"{'json dec us':>14}{'bin dec us':>13}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        result = bench(size, args.repeat)
+        results[size] = result
+        for kind in ("request", "response"):
+            r = result[kind]
+            decode = (f"{r['json_decode_us']:>14.1f}{r['binary_decode_us']:>13.1f}"
+                      if "json_decode_us" in r else f"{'-':>14}{'-':>13}")
+            print(f"{f'{kind} x{size}':<16}{r['json_bytes']:>10}{r['binary_bytes']:>10}{r['binary_base64_bytes']:>10}"
+                  f"{r['json_encode_us']:>14.1f}{r['binary_encode_us']:>13.1f}{decode}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
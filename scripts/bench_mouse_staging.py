@@ -0,0 +1,106 @@
+"""
+Benchmark: mouse-tracker ingestion into mouse_coords directly vs the unlogged staging table.
+
+Writes the same synthetic points through both write paths of backend/mouse-tracker, one
+commit per batch: insert_points_batch plus session_stats.record_points (what track does
+in direct mode), and stage_points_batch. Then times the merge of the staged rows into
+mouse_coords, which also updates the stats. The paths are called explicitly, so
+MOUSE_INGEST_TARGET does not change what is measured. Reports points/sec for each phase
+and for staging plus merge together.
+Needs the V0012 migration applied in DATABASE_URL; rows are left under bench-* sessions.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/bench_mouse_staging.py [--points 100000] [--batch 500]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+FUNCTION_DIR = ROOT / "backend" / "mouse-tracker"
+
+
+def load_function():
+    sys.path.insert(0, str(FUNCTION_DIR))
+    spec = importlib.util.spec_from_file_location("mouse_tracker_index", FUNCTION_DIR / "index.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def batches(total_points: int, batch_size: int):
+    base_ms = int(time.time() * 1000)
+    for start in range(0, total_points, batch_size):
+        yield [
+            {"x": i % 1920, "y": i % 1080, "t": base_ms + i}
+            for i in range(start, min(start + batch_size, total_points))
+        ]
+
+
+def ingest(conn, write, total_points: int, batch_size: int, sessions: int) -> float:
+    """Seconds spent writing total_points with write(cursor, session_id, points)"""
+    run_id = uuid.uuid4().hex[:8]
+    started = time.perf_counter()
+    for n, points in enumerate(batches(total_points, batch_size)):
+        with conn.cursor() as cursor:
+            write(cursor, f"bench-{run_id}-{n % sessions}", points)
+        conn.commit()
+    return time.perf_counter() - started
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=100000, help="points written per mode")
+    parser.add_argument("--batch", type=int, default=500, help="points per INSERT/commit")
+    parser.add_argument("--sessions", type=int, default=50, help="sessions the points are spread over")
+    parser.add_argument("--merge-batch", type=int, default=50000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    function = load_function()
+    import psycopg2
+
+    def write_direct(cursor, session_id, points):
+        new_points = function.insert_points_batch(cursor, session_id, points)
+        function.session_stats.record_points(cursor, session_id, new_points)
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        direct_seconds = ingest(conn, write_direct, args.points, args.batch, args.sessions)
+        staged_seconds = ingest(conn, function.stage_points_batch, args.points, args.batch, args.sessions)
+        started = time.perf_counter()
+        merged = function.staging.merge_all(conn, args.merge_batch)
+        merge_seconds = time.perf_counter() - started
+    finally:
+        conn.close()
+
+    results = {
+        "direct_points_per_sec": args.points / direct_seconds,
+        "staging_points_per_sec": args.points / staged_seconds,
+        "merge_points_per_sec": merged / merge_seconds,
+        "staging_with_merge_points_per_sec": args.points / (staged_seconds + merge_seconds),
+        "merged": merged,
+    }
+    print(f"{'phase':<22}{'points/sec':>14}")
+    print(f"{'direct insert':<22}{results['direct_points_per_sec']:>14.0f}")
+    print(f"{'staging insert':<22}{results['staging_points_per_sec']:>14.0f}")
+    print(f"{'merge':<22}{results['merge_points_per_sec']:>14.0f}")
+    print(f"{'staging + merge':<22}{results['staging_with_merge_points_per_sec']:>14.0f}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
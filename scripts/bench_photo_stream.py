@@ -0,0 +1,135 @@
+"""
+Benchmark: photo-gallery GET ?id= memory and latency, whole-BYTEA read vs chunked read.
+
+Uploads random 1, 10 and 50 MB photos to the database in DATABASE_URL, then
+serves each one in a fresh subprocess per mode so that peak RSS is measured
+in isolation:
+  - whole:   SELECT data + base64.b64encode (the previous implementation)
+  - chunked: the current photo-gallery handler
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/bench_photo_stream.py [--sizes 1 10 50] [--json out.json]
+"""
+
+import argparse
+import base64
+import hashlib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+FUNCTION_DIR = ROOT / "backend" / "photo-gallery"
+MODES = ("whole", "chunked")
+
+
+def load_handler():
+    sys.path.insert(0, str(FUNCTION_DIR))
+    spec = importlib.util.spec_from_file_location("photo_gallery_index", FUNCTION_DIR / "index.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+
+def serve_whole(photo_id: int) -> int:
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT b.data, p.content_type FROM photos p JOIN photo_blobs b USING (content_hash) WHERE p.id = %s",
+                (photo_id,),
+            )
+            data, _ = cur.fetchone()
+            body = base64.b64encode(data).decode("utf-8")
+    finally:
+        conn.close()
+    return len(body)
+
+
+def serve_chunked(photo_id: int, handler) -> int:
+    response = handler({"httpMethod": "GET", "queryStringParameters": {"id": str(photo_id)}}, None)
+    return len(response["body"])
+
+
+def worker(mode: str, photo_id: int) -> None:
+    # Import the handler up front so module loading is not part of the measurement
+    handler = load_handler() if mode == "chunked" else None
+    baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    body_len = serve_chunked(photo_id, handler) if handler else serve_whole(photo_id)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"latency_ms": elapsed * 1000, "peak_rss_mb": peak_kb / 1024,
+                      "rss_growth_mb": (peak_kb - baseline_kb) / 1024, "body_len": body_len}))
+
+
+def upload(cursor, size_mb: int) -> int:
+    data = os.urandom(size_mb * 1024 * 1024)
+    content_hash = hashlib.sha256(data).hexdigest()
+    cursor.execute(
+        "INSERT INTO photo_blobs (content_hash, data, size) VALUES (%s, %s, %s)",
+        (content_hash, psycopg2.Binary(data), len(data)),
+    )
+    cursor.execute(
+        "INSERT INTO photos (filename, content_hash, content_type) VALUES (%s, %s, %s) RETURNING id",
+        (f"bench-{size_mb}mb.bin", content_hash, "application/octet-stream"),
+    )
+    return cursor.fetchone()[0]
+
+
+def remove(cursor, photo_id: int) -> None:
+    cursor.execute("DELETE FROM photos WHERE id = %s RETURNING content_hash", (photo_id,))
+    cursor.execute("DELETE FROM photo_blobs WHERE content_hash = %s", (cursor.fetchone()[0],))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50], help="photo sizes in MB")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--worker", nargs=2, metavar=("MODE", "PHOTO_ID"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    if args.worker:
+        worker(args.worker[0], int(args.worker[1]))
+        return 0
+
+    conn = psycopg2.connect(os.environ["DATABASE_URL"])
+    conn.autocommit = True
+    results = []
+    try:
+        with conn.cursor() as cursor:
+            print(f"{'size':>6}{'mode':>10}{'latency ms':>14}{'RSS growth MB':>16}")
+            for size_mb in args.sizes:
+                photo_id = upload(cursor, size_mb)
+                try:
+                    for mode in MODES:
+                        output = subprocess.run(
+                            [sys.executable, __file__, "--worker", mode, str(photo_id)],
+                            check=True, capture_output=True, text=True,
+                        ).stdout
+                        result = {"size_mb": size_mb, "mode": mode, **json.loads(output)}
+                        results.append(result)
+                        print(f"{size_mb:>6}{mode:>10}{result['latency_ms']:>14.1f}{result['rss_growth_mb']:>16.1f}")
+                finally:
+                    remove(cursor, photo_id)
+    finally:
+        conn.close()
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
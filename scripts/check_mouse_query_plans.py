@@ -0,0 +1,129 @@
+"""
+Query-plan regression check for the mouse-tracker hot queries.
+
+Applies db_migrations/ into a scratch schema of a local Postgres (DATABASE_URL),
+seeds it with millions of mouse_coords rows, runs EXPLAIN on every hot query and
+exits non-zero if a plan contains a sort or a sequential scan, or does not use
+an index-only scan.
+
+Usage:
+    DATABASE_URL=postgresql://localhost/dev python scripts/check_mouse_query_plans.py [--rows 2000000] [--keep]
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+SCHEMA = "plan_check"
+FORBIDDEN_NODES = {"Seq Scan", "Sort", "Incremental Sort"}
+REQUIRED_NODE = "Index Only Scan"
+
+# Same SQL as backend/mouse-tracker, backend/mouse-tracker-ws and their session_stats.repair
+HOT_QUERIES = {
+    "track window": (
+        "SELECT created_at, id, x, y FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 10"
+    ),
+    "session totals (stats repair)": (
+        "SELECT COUNT(*), MIN(created_at), MAX(created_at) FROM mouse_coords WHERE session_id = %s"
+    ),
+    "getStats recent": (
+        "SELECT x, y, created_at FROM mouse_coords WHERE session_id = %s ORDER BY created_at DESC LIMIT 100"
+    ),
+}
+
+
+def apply_migrations(cursor) -> None:
+    for path in sorted((ROOT / "db_migrations").glob("V*.sql")):
+        cursor.execute(path.read_text())
+
+
+def seed(cursor, rows: int, sessions: int) -> None:
+    cursor.execute(
+        """
+        INSERT INTO mouse_coords (x, y, session_id, created_at)
+        SELECT (random() * 1920)::int,
+               (random() * 1080)::int,
+               'plan-' || (g %% %s),
+               CURRENT_TIMESTAMP - (g || ' milliseconds')::interval
+        FROM generate_series(1, %s) AS g
+        """,
+        (sessions, rows),
+    )
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def empty_relations(cursor) -> set:
+    """Empty partitions are scanned sequentially by design; they cost nothing"""
+    cursor.execute(
+        "SELECT relname FROM pg_class WHERE relnamespace = %s::regnamespace AND relkind = 'r' AND reltuples <= 0",
+        (SCHEMA,),
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def check_query(cursor, name: str, sql: str, session_id: str, empty: set) -> list:
+    cursor.execute("EXPLAIN (FORMAT JSON) " + sql, (session_id,))
+    raw = cursor.fetchone()[0]
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+    nodes = [node["Node Type"] for node in plan_nodes(plan) if node.get("Relation Name") not in empty]
+
+    problems = [f"{name}: plan contains {node}" for node in nodes if node in FORBIDDEN_NODES]
+    if REQUIRED_NODE not in nodes:
+        problems.append(f"{name}: no {REQUIRED_NODE} in plan")
+    print(f"{'FAIL' if problems else 'ok':<6}{name:<32}{' -> '.join(nodes)}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {SCHEMA} schema after the run")
+    args = parser.parse_args()
+
+    dsn = os.environ.get("DATABASE_URL")
+    if not dsn:
+        print("DATABASE_URL is not set", file=sys.stderr)
+        return 1
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cursor = conn.cursor()
+    problems = []
+    try:
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        cursor.execute(f"SET search_path TO {SCHEMA}")
+        apply_migrations(cursor)
+        # Seeded rows reach back a few minutes, so yesterday may need a partition too
+        cursor.execute("SELECT mouse_coords_ensure_partition(CURRENT_DATE - 1)")
+        print(f"seeding {args.rows} rows across {args.sessions} sessions...")
+        seed(cursor, args.rows, args.sessions)
+        # Index-only scans need an up-to-date visibility map
+        cursor.execute("VACUUM ANALYZE mouse_coords")
+
+        empty = empty_relations(cursor)
+        for name, sql in HOT_QUERIES.items():
+            problems += check_query(cursor, name, sql, "plan-42", empty)
+    finally:
+        if not args.keep:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
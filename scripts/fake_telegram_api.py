@@ -0,0 +1,194 @@
+"""
+Fake Telegram Bot API for exercising telegram-bot locally (sends, broadcasts, retries).
+
+Answers getMe, sendMessage and sendPhoto under /bot<token>/<method> the way the real
+API does, with params from the query string, a form body or a JSON body. It enforces
+Telegram's limits:
+  - --rate messages per second across all chats, over a sliding one-second window;
+  - one message per second to a private chat, 20 per minute to a group (id starting
+    with '-') or a channel (@name).
+Going over a limit returns 429 with parameters.retry_after, just as Telegram does.
+Chats listed in --blocked get 403 "bot was blocked by the user". --fail-rate makes
+that fraction of requests fail with 502, and --latency adds a delay to each answer.
+
+GET /stats reports request, sent, rate-limited and failed counts, along with chats
+that received the same message more than once. POST /reset clears them.
+
+Usage:
+    python scripts/fake_telegram_api.py [--port 8081] [--rate 30] [--blocked 42,43]
+        [--fail-rate 0.01] [--latency 30]
+    TELEGRAM_API_URL=http://127.0.0.1:8081 TELEGRAM_BOT_TOKEN=1:fake python scripts/local_runtime.py
+"""
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+PRIVATE_INTERVAL = 1.0
+GROUP_WINDOW = 60.0
+GROUP_LIMIT = 20
+TOLERANCE = 0.05
+
+
+class FakeTelegram:
+    def __init__(self, rate: int, blocked: set, fail_rate: float, latency_ms: float):
+        self.rate = rate
+        self.blocked = blocked
+        self.fail_rate = fail_rate
+        self.latency = latency_ms / 1000
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.recent = deque()
+            self.chat_times = {}
+            self.message_id = 0
+            self.deliveries = Counter()
+            self.stats = Counter()
+
+    def retry_after(self, chat_id: str, now: float):
+        """Seconds to wait if this send breaks a limit, else None; call under the lock"""
+        while self.recent and now - self.recent[0] > 1.0:
+            self.recent.popleft()
+        if len(self.recent) >= self.rate:
+            return 1.0 - (now - self.recent[0])
+
+        times = self.chat_times.setdefault(chat_id, deque())
+        if chat_id.startswith("-") or chat_id.startswith("@"):
+            while times and now - times[0] > GROUP_WINDOW:
+                times.popleft()
+            if len(times) >= GROUP_LIMIT:
+                return GROUP_WINDOW - (now - times[0])
+        elif times and now - times[-1] < PRIVATE_INTERVAL - TOLERANCE:
+            return PRIVATE_INTERVAL - (now - times[-1])
+        return None
+
+    def call(self, method: str, params: dict) -> tuple:
+        """(HTTP status, response JSON)"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.stats["requests"] += 1
+            if method == "getMe":
+                return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+            if method not in ("sendMessage", "sendPhoto"):
+                return 404, {"ok": False, "error_code": 404, "description": "Not Found: method not found"}
+
+            chat_id = str(params.get("chat_id", ""))
+            if not chat_id:
+                return 400, {"ok": False, "error_code": 400, "description": "Bad Request: chat_id is empty"}
+            if random.random() < self.fail_rate:
+                self.stats["failed"] += 1
+                return 502, {"ok": False, "error_code": 502, "description": "Bad Gateway"}
+            if chat_id in self.blocked:
+                self.stats["blocked"] += 1
+                return 403, {"ok": False, "error_code": 403, "description": "Forbidden: bot was blocked by the user"}
+
+            now = time.monotonic()
+            wait = self.retry_after(chat_id, now)
+            if wait is not None:
+                self.stats["rate_limited"] += 1
+                retry_after = max(1, math.ceil(wait))
+                return 429, {"ok": False, "error_code": 429, "parameters": {"retry_after": retry_after},
+                             "description": f"Too Many Requests: retry after {retry_after}"}
+
+            self.recent.append(now)
+            self.chat_times[chat_id].append(now)
+            self.message_id += 1
+            self.stats["sent"] += 1
+            self.deliveries[(chat_id, params.get("text") or params.get("caption") or params.get("photo"))] += 1
+            chat_type = "private" if chat_id.lstrip("-").isdigit() and not chat_id.startswith("-") else "group"
+            message = {"message_id": self.message_id, "date": int(time.time()),
+                       "chat": {"id": int(chat_id) if chat_id.lstrip("-").isdigit() else 0, "type": chat_type}}
+            if method == "sendMessage":
+                message["text"] = params.get("text", "")
+            else:
+                message["photo"] = [{"file_id": "fake", "file_unique_id": "fake", "width": 1, "height": 1}]
+                if params.get("caption"):
+                    message["caption"] = params["caption"]
+            return 200, {"ok": True, "result": message}
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            duplicates = {f"{chat}": count for (chat, _), count in self.deliveries.items() if count > 1}
+            return {**self.stats, "chats": len(self.chat_times), "duplicates": duplicates}
+
+
+def make_handler(api: FakeTelegram):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def reply(self, status: int, body: dict) -> None:
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def params(self) -> dict:
+            url = urlsplit(self.path)
+            params = dict(parse_qsl(url.query))
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            content_type = self.headers.get("Content-Type", "")
+            if body and content_type.startswith("application/json"):
+                params.update(json.loads(body))
+            elif body and content_type.startswith("application/x-www-form-urlencoded"):
+                params.update(parse_qsl(body.decode("utf-8")))
+            return params
+
+        def dispatch(self) -> None:
+            path = urlsplit(self.path).path
+            params = self.params()
+            if path == "/stats":
+                return self.reply(200, api.snapshot())
+            if path == "/reset" and self.command == "POST":
+                api.reset()
+                return self.reply(200, {"ok": True})
+            parts = path.strip("/").split("/")
+            if len(parts) != 2 or not parts[0].startswith("bot"):
+                return self.reply(404, {"ok": False, "error_code": 404, "description": "Not Found"})
+            self.reply(*api.call(parts[1], params))
+
+        do_GET = dispatch
+        do_POST = dispatch
+
+    return Handler
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=int, default=30, help="messages per second across all chats")
+    parser.add_argument("--blocked", default="", help="comma-separated chat ids that answer 403")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of sends answered with 502")
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every answer")
+    args = parser.parse_args()
+
+    api = FakeTelegram(args.rate, {c.strip() for c in args.blocked.split(",") if c.strip()},
+                       args.fail_rate, args.latency)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(api))
+    server.daemon_threads = True
+    print(f"fake Telegram Bot API on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,434 @@
+"""
+Local runtime: serves every backend function from one asyncio HTTP/WebSocket server.
+
+Discovers backend/**/index.py and loads each handler once. The route name matches the
+keys of backend/func2url.json, e.g. /mouse-tracker or /telegram-bot-telegram-auth. Each
+function gets a private module namespace, so same-named modules (db_pool, metrics, ...)
+don't clash and lazy imports inside handlers still resolve to the function's own copy.
+Warm state (connection pools, caches) lives as long as the process.
+
+HTTP requests become the usual event (httpMethod, path, headers, queryStringParameters,
+body, isBase64Encoded, requestContext) and context objects. The synchronous handlers run
+on a thread pool of --workers threads.
+
+A WebSocket upgrade on a function route is translated the way the cloud gateway does it:
+CONNECT on handshake, MESSAGE per frame (the response body is sent back as a frame) and
+DISCONNECT on close. A function that ships pubsub.py gets a transport, so pushes reach
+connected sockets directly.
+
+GET / returns func2url.json pointing at this server.
+
+Usage:
+    DATABASE_URL=postgresql://... python scripts/local_runtime.py [--host 127.0.0.1] [--port 8000]
+        [--workers 32] [--functions mouse-tracker,mouse-tracker-ws]
+"""
+
+import argparse
+import asyncio
+import base64
+import builtins
+import hashlib
+import importlib.util
+import json
+import struct
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / "backend"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+MAX_BODY = 32 * 1024 * 1024
+MAX_FRAME = 4 * 1024 * 1024
+TEXT_TYPES = ("text/", "application/json", "application/x-www-form-urlencoded", "application/x-ndjson")
+
+
+class BadRequest(Exception):
+    """The request head can't be parsed; answered with 400 and the connection is closed"""
+
+
+# ----------------------------------------------------------------------------- functions
+
+class FunctionNamespace:
+    """
+    Loads index.py and the sibling modules it imports with a private __import__,
+    so two functions can each have their own db_pool.py in one process
+    """
+
+    def __init__(self, name: str, directory: Path):
+        self.name = name
+        self.directory = directory
+        self.modules = {}
+        self._lock = threading.RLock()
+        self._builtins = dict(builtins.__dict__)
+        self._builtins["__import__"] = self._import
+        self.handler = self.load("index").handler
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top = name.partition(".")[0]
+        if level == 0 and (top in self.modules or (self.directory / f"{top}.py").exists()):
+            return self.load(top)
+        return builtins.__import__(name, globals, locals, fromlist, level)
+
+    def load(self, module_name: str):
+        with self._lock:
+            module = self.modules.get(module_name)
+            if module is not None:
+                return module
+            qualified = f"_local_runtime.{self.name.replace('-', '_')}.{module_name}"
+            spec = importlib.util.spec_from_file_location(qualified, self.directory / f"{module_name}.py")
+            module = importlib.util.module_from_spec(spec)
+            module.__builtins__ = self._builtins
+            self.modules[module_name] = module
+            sys.modules[qualified] = module
+            try:
+                spec.loader.exec_module(module)
+            except BaseException:
+                del self.modules[module_name]
+                sys.modules.pop(qualified, None)
+                raise
+            return module
+
+
+def function_name(directory: Path) -> str:
+    parts = list(directory.relative_to(BACKEND).parts)
+    if parts[0] == "extensions":
+        parts = parts[1:]
+    return "-".join(parts)
+
+
+def discover(names: set = None) -> dict:
+    functions = {}
+    for index in sorted(BACKEND.rglob("index.py")):
+        name = function_name(index.parent)
+        if names and name not in names:
+            continue
+        try:
+            started = time.perf_counter()
+            functions[name] = FunctionNamespace(name, index.parent)
+            print(f"loaded {name:<32} {(time.perf_counter() - started) * 1000:8.1f} ms")
+        except Exception as e:
+            print(f"skipped {name}: {type(e).__name__}: {e}")
+    return functions
+
+
+def make_context(name: str, request_id: str) -> SimpleNamespace:
+    return SimpleNamespace(request_id=request_id, function_name=name, function_version="local",
+                           memory_limit_in_mb=None)
+
+
+def decode_body(body: bytes, content_type: str) -> tuple:
+    """(body, isBase64Encoded) as the gateway passes it"""
+    if not body:
+        return "", False
+    if content_type.startswith(TEXT_TYPES):
+        try:
+            return body.decode("utf-8"), False
+        except UnicodeDecodeError:
+            pass
+    return base64.b64encode(body).decode("ascii"), True
+
+
+def encode_body(response: dict) -> bytes:
+    body = response.get("body") or ""
+    if isinstance(body, (dict, list)):
+        body = json.dumps(body)
+    if response.get("isBase64Encoded"):
+        return base64.b64decode(body)
+    return body.encode("utf-8") if isinstance(body, str) else bytes(body)
+
+
+# ----------------------------------------------------------------------------- websocket
+
+class WebSocket:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, payload: bytes, opcode: int = 0x1) -> None:
+        if self.closed:
+            return
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        async with self._send_lock:
+            try:
+                self.writer.write(header + payload)
+                await self.writer.drain()
+            except ConnectionError:
+                self.closed = True
+
+    async def receive(self):
+        """(opcode, payload) of the next complete message, None when the peer is gone"""
+        message, message_opcode = b"", None
+        while True:
+            try:
+                first, second = await self.reader.readexactly(2)
+                length = second & 0x7F
+                if length == 126:
+                    length = struct.unpack("!H", await self.reader.readexactly(2))[0]
+                elif length == 127:
+                    length = struct.unpack("!Q", await self.reader.readexactly(8))[0]
+                if length > MAX_FRAME or len(message) + length > MAX_FRAME:
+                    await self.close(1009)
+                    return None
+                mask = await self.reader.readexactly(4) if second & 0x80 else b""
+                payload = await self.reader.readexactly(length)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                self.closed = True
+                return None
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+            opcode = first & 0x0F
+            if opcode == 0x8:
+                await self.close()
+                return None
+            if opcode == 0x9:
+                await self.send(payload, opcode=0xA)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode != 0x0:
+                message_opcode = opcode
+            message += payload
+            if first & 0x80:
+                return message_opcode, message
+
+    async def close(self, code: int = 1000) -> None:
+        if not self.closed:
+            await self.send(struct.pack("!H", code), opcode=0x8)
+            self.closed = True
+
+
+# ----------------------------------------------------------------------------- server
+
+class Runtime:
+    def __init__(self, functions: dict, workers: int, base_url: str):
+        self.functions = functions
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="handler")
+        self.base_url = base_url
+        self.sockets = {}
+        self.loop = None
+
+    def install_transports(self) -> None:
+        for function in self.functions.values():
+            pubsub = function.modules.get("pubsub")
+            if pubsub is not None and hasattr(pubsub, "set_transport"):
+                pubsub.set_transport(self.push)
+
+    def push(self, connection_id: str, message: dict) -> bool:
+        """pubsub transport; called from handler and listener threads"""
+        socket = self.sockets.get(connection_id)
+        if socket is None or socket.closed:
+            return False
+        asyncio.run_coroutine_threadsafe(socket.send(json.dumps(message).encode("utf-8")), self.loop)
+        return True
+
+    async def call(self, name: str, event: dict) -> dict:
+        function = self.functions[name]
+        context = make_context(name, event["requestContext"]["requestId"])
+        try:
+            response = await self.loop.run_in_executor(self.executor, function.handler, event, context)
+        except Exception as e:
+            print(f"{name}: unhandled {type(e).__name__}: {e}")
+            return {"statusCode": 502, "body": json.dumps({"error": "Handler raised an exception"})}
+        return response if isinstance(response, dict) else {"statusCode": 200, "body": response}
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        peer = writer.get_extra_info("peername")
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self.serve_websocket(reader, writer, target, headers, peer)
+                    break
+                keep_alive = await self.serve_http(writer, method, target, headers, body, peer)
+                if not keep_alive:
+                    break
+        except BadRequest as e:
+            print(f"bad request from {peer}: {e}")
+            payload = json.dumps({"error": f"Bad Request: {e}"}).encode("utf-8")
+            writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\nConnection: close\r\n\r\n" + payload)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise BadRequest(f"malformed request line {lines[0]!r}") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise BadRequest(f"invalid Content-Length {headers['content-length']!r}") from None
+        if length < 0:
+            raise BadRequest(f"invalid Content-Length {length}")
+        if length > MAX_BODY:
+            raise ConnectionError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    def route(self, target: str) -> tuple:
+        url = urlsplit(target)
+        _, _, rest = url.path.partition("/")
+        name, _, path = rest.partition("/")
+        return name, "/" + path, dict(parse_qsl(url.query, keep_blank_values=True))
+
+    def base_event(self, name: str, path: str, params: dict, headers: dict, peer) -> dict:
+        return {
+            "path": path,
+            "headers": {key.title(): value for key, value in headers.items()},
+            "queryStringParameters": params,
+            "requestContext": {
+                "requestId": uuid.uuid4().hex,
+                "identity": {"sourceIp": peer[0] if peer else None},
+                "functionName": name,
+            },
+        }
+
+    async def serve_http(self, writer, method: str, target: str, headers: dict, body: bytes, peer) -> bool:
+        started = time.perf_counter()
+        name, path, params = self.route(target)
+        keep_alive = headers.get("connection", "").lower() != "close"
+
+        if not name and method == "GET":
+            response = {"statusCode": 200, "headers": {"Content-Type": "application/json"},
+                        "body": json.dumps({n: f"{self.base_url}/{n}" for n in self.functions}, indent=2)}
+        elif name not in self.functions:
+            response = {"statusCode": 404, "body": json.dumps({"error": f"No function {name!r}"})}
+        else:
+            event = self.base_event(name, path, params, headers, peer)
+            event["httpMethod"] = method
+            event["requestContext"]["httpMethod"] = method
+            event["body"], event["isBase64Encoded"] = decode_body(body, headers.get("content-type", ""))
+            response = await self.call(name, event)
+
+        payload = encode_body(response)
+        status = int(response.get("statusCode", 200))
+        response_headers = {"Content-Type": "application/json", **(response.get("headers") or {})}
+        response_headers["Content-Length"] = str(len(payload))
+        response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        head = f"HTTP/1.1 {status} {reason}\r\n" + "".join(f"{k}: {v}\r\n" for k, v in response_headers.items())
+        writer.write(head.encode("latin-1") + b"\r\n" + payload)
+        await writer.drain()
+        print(f"{method} {target} {status} {(time.perf_counter() - started) * 1000:.1f}ms")
+        return keep_alive
+
+    async def serve_websocket(self, reader, writer, target: str, headers: dict, peer) -> None:
+        name, path, params = self.route(target)
+        if name not in self.functions or "sec-websocket-key" not in headers:
+            writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+            return
+
+        connection_id = uuid.uuid4().hex
+
+        def event_for(event_type: str, body: str = "", is_base64: bool = False) -> dict:
+            event = self.base_event(name, path, params, headers, peer)
+            event["httpMethod"] = "POST"
+            event["body"], event["isBase64Encoded"] = body, is_base64
+            event["requestContext"].update({"eventType": event_type, "connectionId": connection_id})
+            return event
+
+        connected = await self.call(name, event_for("CONNECT"))
+        if int(connected.get("statusCode", 200)) >= 400:
+            writer.write(f"HTTP/1.1 {connected['statusCode']} Rejected\r\nContent-Length: 0\r\n\r\n".encode())
+            await writer.drain()
+            return
+
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WS_GUID).encode()).digest())
+        writer.write(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Accept: " + accept + b"\r\n\r\n")
+        await writer.drain()
+        socket = WebSocket(reader, writer)
+        self.sockets[connection_id] = socket
+        print(f"WS {target} connected {connection_id}")
+
+        try:
+            while True:
+                message = await socket.receive()
+                if message is None:
+                    break
+                opcode, payload = message
+                if opcode == 0x1:
+                    event = event_for("MESSAGE", payload.decode("utf-8"))
+                else:
+                    event = event_for("MESSAGE", base64.b64encode(payload).decode("ascii"), True)
+                response = await self.call(name, event)
+                reply = encode_body(response)
+                if reply:
+                    await socket.send(reply, opcode=0x2 if response.get("isBase64Encoded") else 0x1)
+        finally:
+            self.sockets.pop(connection_id, None)
+            socket.closed = True
+            await self.call(name, event_for("DISCONNECT"))
+            print(f"WS {target} disconnected {connection_id}")
+
+    async def serve(self, host: str, port: int) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.install_transports()
+        server = await asyncio.start_server(self.serve_connection, host, port, limit=64 * 1024)
+        print(f"serving {len(self.functions)} functions on {self.base_url}")
+        async with server:
+            await server.serve_forever()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=32, help="thread pool size for handlers")
+    parser.add_argument("--functions", help="comma-separated route names (default: all)")
+    args = parser.parse_args()
+
+    functions = discover(set(args.functions.split(",")) if args.functions else None)
+    if not functions:
+        print("no functions loaded", file=sys.stderr)
+        return 1
+    runtime = Runtime(functions, args.workers, f"http://{args.host}:{args.port}")
+    try:
+        asyncio.run(runtime.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Cold-start profile: per-module import time of every backend function.
+
+For each backend/**/index.py a fresh interpreter is started with -X importtime
+(cwd and sys.path set to the function directory, as on the platform). It loads
+index.py and then calls the handler with a CORS preflight (OPTIONS) event. The
+-X importtime output is split at that point and aggregated:
+  - wall time to load index.py, as the median over --runs cold starts;
+  - the modules with the largest cumulative import time, under the top-level
+    import that pulled them in;
+  - modules imported during the preflight call itself. Ideally there are none,
+    so preflight and validation paths don't pay for heavy dependencies.
+A function whose dependency is missing still reports what it managed to import.
+
+Usage:
+    python scripts/profile_imports.py [--functions telegram-bot,telegram-auth] [--runs 5]
+        [--top 10] [--output imports.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / "backend"
+START_MARKER = "profile_imports: loading handler"
+MARKER = "profile_imports: handler loaded"
+PREFIX = "import time:"
+
+# Runs in the child interpreter: wall time of the index.py load goes to stdout,
+# -X importtime output and the markers go to stderr. The worker's own imports
+# come before the start marker and are not counted
+WORKER = f"""
+import importlib.util, io, json, sys, time
+from contextlib import redirect_stdout
+sys.path.insert(0, '.')
+result = {{}}
+with redirect_stdout(io.StringIO()):
+    sys.stderr.write({START_MARKER!r} + '\\n')
+    started = time.perf_counter()
+    try:
+        spec = importlib.util.spec_from_file_location('index', 'index.py')
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception as e:
+        result['error'] = f'{{type(e).__name__}}: {{e}}'
+    result['load_ms'] = (time.perf_counter() - started) * 1000
+    sys.stderr.write({MARKER!r} + '\\n')
+    sys.stderr.flush()
+    if 'error' not in result:
+        started = time.perf_counter()
+        try:
+            response = module.handler({{'httpMethod': 'OPTIONS', 'headers': {{}}, 'queryStringParameters': {{}},
+                                       'body': '', 'requestContext': {{}}}}, None)
+            result['preflight_status'] = response.get('statusCode')
+        except Exception as e:
+            result['preflight_error'] = f'{{type(e).__name__}}: {{e}}'
+        result['preflight_ms'] = (time.perf_counter() - started) * 1000
+print(json.dumps(result))
+"""
+
+
+def discover(names: set = None) -> list:
+    return [index.parent for index in sorted(BACKEND.rglob("index.py"))
+            if not names or index.parent.name in names]
+
+
+def parse_importtime(lines: list) -> list:
+    """[(depth, module, self_us, cumulative_us)] in output order: children before their parent"""
+    entries = []
+    for line in lines:
+        if not line.startswith(PREFIX) or "imported package" in line:
+            continue
+        self_us, cumulative_us, name = line[len(PREFIX):].split("|", 2)
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        entries.append((depth, stripped.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def attribute(entries: list) -> list:
+    """Adds the top-level import each module was pulled in by: [(module, root, self_us, cumulative_us)]"""
+    result = []
+    pending = []
+    for depth, name, self_us, cumulative_us in entries:
+        pending.append((name, self_us, cumulative_us))
+        if depth == 0:
+            result.extend((module, name, s, c) for module, s, c in pending)
+            pending = []
+    result.extend((module, module, s, c) for module, s, c in pending)
+    return result
+
+
+def profile_once(function_dir: Path) -> tuple:
+    env = {**os.environ, "METRICS_LOG": "0", "PYTHONDONTWRITEBYTECODE": "1"}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", WORKER],
+        capture_output=True, text=True, cwd=function_dir, env=env
+    )
+    stderr = completed.stderr.splitlines()
+    start = stderr.index(START_MARKER) if START_MARKER in stderr else 0
+    split = stderr.index(MARKER) if MARKER in stderr else len(stderr)
+    try:
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+    except (IndexError, json.JSONDecodeError):
+        result = {"error": (stderr[-1] if stderr else "worker failed")}
+    return result, parse_importtime(stderr[start:split]), parse_importtime(stderr[split:])
+
+
+def profile_function(function_dir: Path, runs: int, top: int) -> dict:
+    loads, preflights = [], []
+    for _ in range(runs):
+        result, load_entries, call_entries = profile_once(function_dir)
+        loads.append(result.get("load_ms", 0.0))
+        if "preflight_ms" in result:
+            preflights.append(result["preflight_ms"])
+
+    modules = attribute(load_entries)
+    roots = {}
+    for module, root, self_us, cumulative_us in modules:
+        if module == root:
+            roots[root] = cumulative_us
+
+    report = {
+        "load_ms": round(statistics.median(loads), 2),
+        "modules_imported": len(modules),
+        "import_self_ms": round(sum(m[2] for m in modules) / 1000, 2),
+        "top_level": [
+            {"module": name, "cumulative_ms": round(us / 1000, 2)}
+            for name, us in sorted(roots.items(), key=lambda item: -item[1])[:top]
+        ],
+        "slowest": [
+            {"module": module, "via": root, "self_ms": round(s / 1000, 2), "cumulative_ms": round(c / 1000, 2)}
+            for module, root, s, c in sorted(modules, key=lambda m: -m[2])[:top]
+        ],
+        "preflight_imports": [name for _, name, _, _ in call_entries],
+    }
+    if preflights:
+        report["preflight_ms"] = round(statistics.median(preflights), 3)
+    for key in ("error", "preflight_error", "preflight_status"):
+        if key in result:
+            report[key] = result[key]
+    return report
+
+
+def print_report(results: dict) -> None:
+    for name, report in results.items():
+        print(f"{name}: load {report['load_ms']} ms, {report['modules_imported']} modules, "
+              f"{report['import_self_ms']} ms importing"
+              + (f", preflight {report['preflight_ms']} ms" if "preflight_ms" in report else ""))
+        if "error" in report:
+            print(f"  load failed: {report['error']}")
+        for entry in report["top_level"]:
+            print(f"  {entry['cumulative_ms']:>9.2f} ms  {entry['module']}")
+        if report["preflight_imports"]:
+            print(f"  imported during preflight: {', '.join(report['preflight_imports'])}")
+        print()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", help="comma-separated function directory names (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per function; load time is the median")
+    parser.add_argument("--top", type=int, default=10, help="modules listed per function")
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args()
+
+    names = set(args.functions.split(",")) if args.functions else None
+    results = {}
+    for function_dir in discover(names):
+        results[str(function_dir.relative_to(BACKEND))] = profile_function(function_dir, args.runs, args.top)
+
+    print_report(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
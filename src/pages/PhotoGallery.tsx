@@ -19,9 +19,17 @@ export default function PhotoGallery() {
   const { toast } = useToast();
 
   const loadPhotos = async () => {
-    const response = await fetch(PHOTO_API);
-    const data = await response.json();
-    setPhotos(data.photos || []);
+    const all: Photo[] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ limit: '200' });
+      if (cursor) params.set('after', cursor);
+      const response = await fetch(`${PHOTO_API}?${params}`);
+      const data = await response.json();
+      all.push(...(data.photos || []));
+      cursor = data.next_cursor || null;
+    } while (cursor);
+    setPhotos(all);
   };
 
   useEffect(() => {